@@ -0,0 +1,71 @@
+MAX_DISTINCT_ALARMS = 100  # Distinct alarms kept per line or table, any others are counted together
+OTHER_ALARMS = 'Other alarms'
+
+
+class LineAlarms:
+    """The alarms raised during one runtime line, each distinct alarm stored once with a count.
+
+    entries is the list that goes out as the line's details:
+    [{'alarm': 'Gas low', 'count': 3120, 'first': '...', 'last': '...'}], in the order first seen.
+    An alarm storm only bumps a count and a timestamp, so the details stay the same size.
+    """
+
+    __slots__ = ('entries', 'index')
+
+    def __init__(self, entries=None):
+        self.entries = []
+        self.index = {}  # Alarm message -> its entry in self.entries
+        for entry in entries or []:
+            if isinstance(entry, str):
+                self.add(entry)  # Saved before alarms were counted, one string per occurrence
+            else:
+                self.entries.append(entry)
+                self.index[entry['alarm']] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, alarm, timestamp=None):
+        """Count one occurrence of an alarm. Returns True the first time this line sees it."""
+        entry = self.index.get(alarm)
+        if entry is None and len(self.entries) >= MAX_DISTINCT_ALARMS:
+            entry = self.index.get(OTHER_ALARMS)
+            alarm = OTHER_ALARMS
+        if entry is not None:
+            entry['count'] += 1
+            if timestamp:
+                entry['first'] = entry['first'] or timestamp
+                entry['last'] = timestamp
+            return False
+
+        entry = {'alarm': alarm, 'count': 1, 'first': timestamp, 'last': timestamp}
+        self.entries.append(entry)
+        self.index[alarm] = entry
+        return True
+
+
+class AlarmFrequency:
+    """How many times each alarm has been raised on one laser, across runtimes."""
+
+    __slots__ = ('counts', 'changed')
+
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {})
+        self.changed = True  # Whether the counts changed since they were last sent
+
+    def add(self, alarm):
+        if alarm not in self.counts and len(self.counts) >= MAX_DISTINCT_ALARMS:
+            alarm = OTHER_ALARMS
+        self.counts[alarm] = self.counts.get(alarm, 0) + 1
+        self.changed = True
+
+
+def fleet_alarm_table(counts_by_laser):
+    """Merge each laser's alarm counts into one table, most frequent alarm first."""
+    table = {}
+    for laser_id, counts in counts_by_laser.items():
+        for alarm, count in (counts or {}).items():
+            row = table.setdefault(alarm, {'alarm': alarm, 'count': 0, 'lasers': {}})
+            row['count'] += count
+            row['lasers'][laser_id] = count
+    return sorted(table.values(), key=lambda row: row['count'], reverse=True)
@@ -0,0 +1,30 @@
+import os
+import json
+
+
+def dump_checkpoint(checkpoint):
+    """Serialize a checkpoint, where the state in it cannot change meanwhile (on the event loop)."""
+    return json.dumps(checkpoint, default=str)
+
+
+def save_checkpoint(path, text):
+    """Atomically replace the checkpoint file with dump_checkpoint's text, so a crash mid-write never
+    leaves a torn checkpoint."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """Return the saved checkpoint, or None if there is none or it cannot be read."""
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable checkpoint {path}: {e}")
+        return None
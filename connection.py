@@ -0,0 +1,35 @@
+import socketio
+import asyncio
+import random
+
+RECONNECT_MIN_DELAY = 1   # Seconds before the first reconnect attempt
+RECONNECT_MAX_DELAY = 60  # Longest wait between reconnect attempts
+
+
+def create_client():
+    """Socket.IO client that leaves reconnecting to keep_connected, so every attempt uses our backoff."""
+    return socketio.AsyncClient(reconnection=False)
+
+
+def reconnect_delay(attempt):
+    """Exponential backoff with jitter, so monitors that lost the server together don't all retry together."""
+    delay = min(RECONNECT_MAX_DELAY, RECONNECT_MIN_DELAY * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+
+async def keep_connected(sio, server_url):
+    """Connect to the server and reconnect whenever the connection drops, for as long as the task runs."""
+    attempt = 0
+    while True:
+        if not sio.connected:
+            try:
+                await sio.connect(server_url)
+            except (socketio.exceptions.ConnectionError, OSError) as e:
+                delay = reconnect_delay(attempt)
+                attempt += 1
+                print(f"Could not connect to server at {server_url} ({e}), retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+                continue
+            attempt = 0
+        await sio.wait()  # Returns once the connection is lost
+        await asyncio.sleep(RECONNECT_MIN_DELAY)
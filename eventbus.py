@@ -0,0 +1,111 @@
+import asyncio
+import time
+from collections import namedtuple
+
+# What the log parser publishes. Times are the UTC ISO log times the events happened at.
+StatusChanged = namedtuple('StatusChanged', ['laser', 'status', 'time', 'shift'])
+ShiftChanged = namedtuple('ShiftChanged', ['laser', 'status', 'time', 'shift'])
+PartCounted = namedtuple('PartCounted', ['laser', 'time', 'session_count'])
+AlarmRaised = namedtuple('AlarmRaised', ['laser', 'alarm', 'time'])
+RuntimeFinalized = namedtuple('RuntimeFinalized', ['laser', 'runtime_data'])
+
+# What a sink does with a new event when its queue is full
+DROP_OLDEST = 'drop_oldest'  # Make room by dropping the oldest queued event
+COALESCE = 'coalesce'        # Drop the new event, the ones already queued will cover it
+
+
+class Sink:
+    """One consumer of bus events, with its own bounded queue, batching and overflow policy.
+
+    handle is awaited with a batch of up to max_batch events, gathered for linger seconds after the
+    first one arrives. A maxsize of 0 never drops anything, for events that must not be lost.
+    """
+
+    def __init__(self, name, handle, event_types=None, maxsize=100, overflow=DROP_OLDEST, max_batch=100, linger=0):
+        self.name = name
+        self.handle = handle
+        self.event_types = tuple(event_types) if event_types else None  # None takes every event
+        self.queue = asyncio.Queue(maxsize)
+        self.overflow = overflow
+        self.max_batch = max_batch
+        self.linger = linger
+        self.dropped = 0  # Events lost to the overflow policy
+        self.busy_since = None  # Monotonic time the batch being handled was taken, for spotting a stuck sink
+        self.task = None
+
+    def offer(self, event):
+        """Queue an event without ever waiting, applying the overflow policy if the queue is full."""
+        if self.event_types is not None and not isinstance(event, self.event_types):
+            return
+        try:
+            self.queue.put_nowait(event)
+            return
+        except asyncio.QueueFull:
+            pass
+        if self.overflow == DROP_OLDEST:
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.queue.put_nowait(event)
+            self.dropped += 1
+        # COALESCE: what is already queued will wake the sink up anyway
+
+    def idle(self):
+        """Nothing queued and nothing being handled."""
+        return self.queue.empty() and self.busy_since is None
+
+    async def run(self):
+        while True:
+            batch = [await self.queue.get()]
+            if self.linger:
+                await asyncio.sleep(self.linger)
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            self.busy_since = time.monotonic()
+            try:
+                await self.handle(batch)
+            except Exception as e:
+                print(f"Sink {self.name} could not handle {len(batch)} events: {e}")
+            finally:
+                self.busy_since = None
+                for _ in batch:
+                    self.queue.task_done()
+
+
+class EventBus:
+    """Hands each published event to every sink's queue, so the publisher never waits on a sink."""
+
+    def __init__(self):
+        self.sinks = []
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def publish(self, event):
+        for sink in self.sinks:
+            sink.offer(event)
+
+    def start(self):
+        """Run each sink as a task on the current loop (again, if it was stopped)."""
+        for sink in self.sinks:
+            if sink.task is None or sink.task.done():
+                sink.task = asyncio.ensure_future(sink.run())
+
+    def idle(self, *names):
+        """Whether the sinks (or only the ones named) have handled everything published to them."""
+        return all(sink.idle() for sink in self.sinks if not names or sink.name in names)
+
+    async def drain(self, *names):
+        """Wait until the running sinks (or only the ones named) have handled what is queued for them."""
+        for sink in self.sinks:
+            if names and sink.name not in names:
+                continue
+            if sink.task is not None and not sink.task.done():
+                await sink.queue.join()
+
+    async def stop(self):
+        await self.drain()
+        for sink in self.sinks:
+            if sink.task is not None:
+                sink.task.cancel()
+                sink.task = None
@@ -0,0 +1,56 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+FILE_IO_WORKERS = 16  # Threads shared by every monitor in the process for log file access
+FILE_IO_TIMEOUT = 30  # Seconds before a single file operation is given up on
+MAX_IN_FLIGHT = 2     # File operations one monitor may have running (or hung) at once
+
+default_executor = None
+
+
+def get_default_executor():
+    """Return the process-wide file I/O thread pool, creating it on first use."""
+    global default_executor
+    if default_executor is None:
+        default_executor = ThreadPoolExecutor(max_workers=FILE_IO_WORKERS, thread_name_prefix='log-io')
+    return default_executor
+
+
+class FileIO:
+    """Run one monitor's blocking file calls on the shared thread pool with a timeout.
+
+    A call that hangs (e.g. on an unreachable SMB share) keeps its in-flight slot until it really
+    returns, so one bad share can tie up at most max_in_flight threads and only stalls its own monitor.
+    """
+
+    def __init__(self, name, executor=None, timeout=FILE_IO_TIMEOUT, max_in_flight=MAX_IN_FLIGHT):
+        self.name = name
+        self.executor = executor
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.slots = None  # Created on first use, inside the running event loop
+
+    async def call(self, func, *args, timeout=None):
+        """Run func(*args) on the thread pool and return its result, raising TimeoutError if it takes too long."""
+        timeout = timeout or self.timeout
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_in_flight)
+
+        try:
+            await asyncio.wait_for(self.slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"[{self.name}] File access still blocked by earlier calls after {timeout}s")
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor or get_default_executor(), partial(func, *args))
+        future.add_done_callback(self.release_slot)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"[{self.name}] {getattr(func, '__name__', func)} did not finish within {timeout}s")
+
+    def release_slot(self, future):
+        self.slots.release()
+        if not future.cancelled():
+            future.exception()  # Mark an abandoned call's error as retrieved
@@ -15,12 +15,16 @@ function connectSocket(serverUrl, laserId) {
         console.log(`Connection closed for ${laserId}`);
     });
 
+    // Sequence number of the last runtime message applied, deltas must follow on from it
+    let lastSeq = null;
+
     // Listen for `runtime_message` event
     socket.on('runtime_message', function(data) {
         console.log("Received full runtime:", data);
 
         // Ensure the runtime is for the correct laser
         if (data.laser === laserId && Array.isArray(data.runtime)) {
+            lastSeq = data.seq !== undefined ? data.seq : null;
             resetRuntime();  // Clear the previous runtime data
             // Update the log with the entire runtime
             data.runtime.forEach(addOrUpdateLogEntry);  // Add each event in the runtime
@@ -41,14 +45,64 @@ function connectSocket(serverUrl, laserId) {
         }
     });
 
+    // Listen for `runtime_delta` events, which only carry the lines that changed
+    socket.on('runtime_delta', function(data) {
+        if (data.laser !== laserId) {
+            return;
+        }
+        if (lastSeq === null || data.seq !== lastSeq + 1) {
+            // We missed an update, ask for the full runtime again
+            console.log(`Missed runtime updates for ${laserId}, requesting the full runtime`);
+            lastSeq = null;
+            socket.emit('join', { 'laser_id': laserId });
+            return;
+        }
+        lastSeq = data.seq;
+
+        data.ops.forEach(function(op) {
+            if (op.op === 'reset') {
+                resetRuntime();
+            } else {
+                addOrUpdateLogEntry(op.line);
+                updateLaserBox(op.line);
+            }
+        });
+
+        if (data.avg_cutting_time) {
+            document.getElementById('avgCuttingTime').innerText = data.avg_cutting_time;
+        }
+        if (data.avg_idle_time) {
+            document.getElementById('avgIdleTime').innerText = data.avg_idle_time;
+        }
+    });
+
+    // The monitor stopped reading the log file (Offline) or is reading it again (Online)
+    socket.on('monitor_status', function(data) {
+        if (data.laser !== laserId) {
+            return;
+        }
+        monitorOffline = data.status === 'Offline';
+        if (monitorOffline) {
+            console.log(`Monitor for ${laserId} is offline: ${data.reason}`);
+            updateLaserBox(data);
+        } else {
+            // Get the full runtime again for the current status
+            socket.emit('join', { 'laser_id': laserId });
+        }
+    });
+
     return socket;
 }
 
+// Whether the laser's monitor is not reading its log, its last status would be stale
+let monitorOffline = false;
+
 // Function to update the visual status of the laser box based on the most recent status
 function updateLaserBox(data) {
     const laserBox = document.getElementById(data.laser);
     if (laserBox) {
-        laserBox.className = `box ${data.status}`;  // Update box color based on status
+        const status = monitorOffline ? 'Offline' : data.status;
+        laserBox.className = `box ${status}`;  // Update box color based on status
     } else {
         console.error(`No element found with ID: ${data.laser}`);
     }
@@ -67,6 +121,19 @@ function resetRuntime() {
     document.getElementById('avgIdleTime').innerText = '';
 }
 
+// Each distinct alarm comes once with how many times it was raised
+function formatAlarms(details) {
+    if (!Array.isArray(details) || details.length === 0) {
+        return 'N/A';
+    }
+    return details.map(entry => {
+        if (typeof entry === 'string') {
+            return entry;
+        }
+        return entry.count > 1 ? `${entry.alarm} (x${entry.count})` : entry.alarm;
+    }).join('<br>');
+}
+
 // Function to add or update a log entry
 function addOrUpdateLogEntry(data) {
     const logDataTable = document.getElementById('logDataTable').getElementsByTagName('tbody')[0];
@@ -75,7 +142,7 @@ function addOrUpdateLogEntry(data) {
     const endTime = data.end_time !== 'Ongoing' ? new Date(data.end_time).toLocaleString() : 'Ongoing';
     const partCount = data.session_part_count || 0;
     const totalTime = data.total_time || 'N/A';
-    const details = data.details || 'N/A'
+    const details = formatAlarms(data.details);
 
     // Update the part file and tech data display if available
     if (data.part_file) {
@@ -98,6 +165,7 @@ function addOrUpdateLogEntry(data) {
         existingRow.cells[2].innerText = endTime;
         existingRow.cells[3].innerText = totalTime;
         existingRow.cells[4].innerText = partCount;
+        existingRow.cells[5].innerHTML = details;
     } else {
         // Create a new row if it doesn't exist
         const row = logDataTable.insertRow(0);
@@ -0,0 +1,925 @@
+import socketio
+import os
+import time as time_module
+from datetime import datetime, timedelta, timezone
+import asyncio
+
+from alarmcounts import AlarmFrequency, LineAlarms
+from checkpoint import dump_checkpoint, load_checkpoint, save_checkpoint
+from connection import create_client, keep_connected
+from eventbus import (EventBus, Sink, COALESCE, DROP_OLDEST,
+                      StatusChanged, ShiftChanged, PartCounted, AlarmRaised, RuntimeFinalized)
+from fileio import FileIO
+from logclassifier import LineClassifier
+from logreader import LogReader
+from logtime import LogTimestampParser
+from metrics import METRICS_INTERVAL, MonitorMetrics
+from runtimedelta import RESET, APPEND, UPDATE
+from runtimemodel import Runtime, RuntimeLine
+from runtimestats import LaserStats
+from shiftschedule import ShiftSchedule
+from monitorwatchdog import Heartbeat, MonitorWatchdog
+
+MIN_POLL_INTERVAL = 0.25  # Seconds between polls right after new lines arrived
+MAX_POLL_INTERVAL = 2     # Longest pause between polls while the log file is idle
+CHECKPOINT_INTERVAL = 10  # Seconds between checkpoint writes while new lines are arriving
+ROTATION_CHECK_INTERVAL = 5  # Seconds between checks for a rotated log file while it is idle
+MAX_RUNTIME_LINES = 500   # Runtime lines held in memory before the journaled ones are dropped
+RUNTIME_LINES_KEPT = 100  # Newest runtime lines that stay in memory after that
+MAX_PENDING_OPS = 1000    # Runtime changes held while the server is away before falling back to a snapshot
+RECOVERY_SCAN_LIMIT = 32 * 1024 * 1024    # Bytes of log read again at startup to rebuild the current runtime
+SETUP_SCAN_LIMIT = 256 * 1024 * 1024      # Bytes searched back for the setup that started it
+RECOVERY_SETUP_SIZE = 1024 * 1024         # Bytes read from that setup for its part file and tech data
+FILE_RETRIES = 5          # Checks for a missing log file before giving up on it and finalizing the runtime
+FILE_RETRY_INTERVAL = 60  # Seconds between those checks
+EXPORT_RETRY_MIN_DELAY = 5    # Seconds before retrying a finalized runtime that could not be written
+EXPORT_RETRY_MAX_DELAY = 300  # Longest wait between those retries
+EXPORT_WAIT = 30  # Seconds a checkpoint waits for earlier runtimes to be exported before it is skipped
+
+class LaserLogMonitor:
+    def __init__(self, laser_id, equipment_name, filename, server_url, sio=None, classifier=None,
+                 shift_schedule=None, quiet_limits=None):
+        self.laser_id = laser_id
+        self.equipment_name = equipment_name
+        self.filename = filename
+        self.server_url = server_url
+        self.current_status = "unknown"  # Track the current status to detect changes
+        self.start_time = None  # Track the start time of the current status
+        self.part_count = 0  # Initialize part count for the runtime
+        self.session_part_count = 0  # Initialize part count for the current cutting session
+        self.current_runtime = self.new_runtime()  # Store all data for the current runtime (runtime lines)
+        self.current_alarms = LineAlarms()  # Alarms detected in the current status, counted per alarm
+        self.alarm_counts = AlarmFrequency()  # How often each alarm was raised on this laser
+        self.stats = LaserStats()  # Duration percentiles and utilization, kept across runtimes
+        # A supervisor running several monitors passes in one shared client and owns its connection
+        self.owns_connection = sio is None
+        self.sio = sio or create_client()
+        self.connection_task = None  # Keeps our own connection up, when we own it
+        self.total_cutting_duration = timedelta()  # Track total cutting duration
+        self.total_idle_duration = timedelta()     # Track total idle duration
+        self.cutting_count = 0                     # Count occurrences of cutting
+        self.idle_count = 0 
+        self.current_shift_type = None  # Keep track of the current shift type
+        self.shift_schedule = shift_schedule or ShiftSchedule()
+        self.next_shift_boundary = None  # When the current shift ends (UTC ISO timestamp)
+        self.runtime_seq = 0  # Sequence number of the last runtime message sent
+        self.pending_ops = []  # Runtime changes (op, line index) not sent yet
+        self.snapshot_needed = True  # Send the full runtime first, then only deltas
+        self.timestamps = LogTimestampParser()  # Parses the time each log line was written
+        self.last_log_time = None  # Timestamp of the latest log line processed
+        self.last_log_monotonic = None  # Monotonic time last_log_time was read, the log clock runs on from there
+        self.bytes_behind = 0  # How far behind the end of the log file we are (lag metric)
+        self.poll_interval = MIN_POLL_INTERVAL  # Current idle poll interval
+        self.checkpoint_path = f'checkpoint_{laser_id}.json'
+        self.last_checkpoint_time = 0
+        self.last_checkpoint_offset = None
+        self.checkpoint_due = False  # A runtime was finalized, the checkpoint must stop pointing at its journal
+        self.skipping_exported = False  # Reading log lines already in a runtime exported before a crash
+        self.applied_offset = 0  # Read offset up to which every block has been fully applied to the state
+        self.last_rotation_check = 0
+        self.metrics = MonitorMetrics()  # Hot-path counters and latencies, reported to the server
+        self.heartbeat = Heartbeat()  # Checked by the watchdog that restarts a stuck log loop
+        self.quiet_limits = quiet_limits  # Longest the log may stay quiet per status, None for the defaults
+        self.offline_reason = "Monitor starting"  # Why the log is not being read, the dashboard shows us Offline
+        self.offline_until_lines = False  # Stay Offline until new lines arrive, not just until the log is open
+
+        # Parsing publishes events and never waits for what is done with them, each sink has its own queue.
+        # The sender only needs waking up, the delta is built from the runtime when it sends.
+        self.bus = EventBus()
+        self.bus.add_sink(Sink('socketio', self.send_runtime_batch, event_types=(StatusChanged, ShiftChanged),
+                               maxsize=1, overflow=COALESCE))
+        # Finished runtime lines are journaled off the event loop, one write covers every line finished since the last
+        self.bus.add_sink(Sink('journal', self.journal_batch, event_types=(StatusChanged, ShiftChanged),
+                               maxsize=1, overflow=COALESCE))
+        # A finalized runtime must reach the uploader, so that queue is never cut short
+        self.bus.add_sink(Sink('export', self.export_batch, event_types=(RuntimeFinalized,), maxsize=0))
+        self.bus.add_sink(Sink('metrics', self.count_events, maxsize=1000, overflow=DROP_OLDEST, max_batch=1000))
+
+        if self.owns_connection:
+            self.sio.on('connect', handler=self.on_connect)
+            self.sio.on('disconnect', handler=self.on_disconnect)
+
+        self.classifier = classifier or LineClassifier()  # Shared, precompiled line classifier
+        self.file_io = FileIO(laser_id)  # Runs file access off the event loop with timeouts
+
+        # Track part file and tech data during setup phases
+        self.current_phase = {
+            "part_file": None,
+            "tech_data": None
+        }
+
+    async def on_connect(self):
+        print(f"Connected to server at {self.server_url}")
+        self.metrics.count('connects_total')
+        # Flush what piled up while we were away in one message, a restarted server asks for a snapshot
+        asyncio.ensure_future(self.send_runtime(always=True))
+        asyncio.ensure_future(self.send_monitor_status())
+
+    async def on_disconnect(self):
+        print("Disconnected from server")
+
+    async def check_file_exists(self):
+        """Check if the log file exists and is accessible, raising FileNotFoundError once out of retries."""
+        retry_count = 0
+        while retry_count < FILE_RETRIES:
+            self.heartbeat.beat()  # Waiting for the file is not a stall
+            try:
+                exists = await self.file_io.call(os.path.exists, self.filename)
+            except TimeoutError as e:
+                print(e)
+                exists = False
+            if not exists:
+                retry_count += 1
+                print(f"[{self.laser_id}] Log file not found, retrying in {FILE_RETRY_INTERVAL} seconds... "
+                      f"({retry_count}/{FILE_RETRIES})")
+                await self.set_offline("Log file not found")
+                await asyncio.sleep(FILE_RETRY_INTERVAL)
+            else:
+                return True
+        # Finalize runtime if file is not found after retries
+        print(f"[{self.laser_id}] Log file not found after retries, finalizing runtime.")
+        await self.finalize_current_runtime()
+        self.start_new_runtime()  # The finalized runtime's journal has been handed to the uploader
+        # The watchdog looks for it again after a pause that grows while it stays away
+        raise FileNotFoundError(f"Log file {self.filename} not found after {FILE_RETRIES} retries")
+
+    async def read_log_block(self, reader):
+        """Read the next block of complete log lines, only pausing once we have caught up."""
+        offset = reader.offset
+        text = await self.file_io.call(reader.read_block)
+        self.bytes_behind = reader.bytes_behind
+        if text:
+            self.poll_interval = MIN_POLL_INTERVAL
+            self.heartbeat.progress(reader.offset)
+            if self.offline_reason is not None:
+                await self.set_online()
+            self.metrics.count('lines_total', text.count(b'\n'))
+            self.metrics.count('bytes_total', max(reader.offset - offset, 0))
+
+        if self.bytes_behind > 0:
+            # Catching up: keep reading without pausing, but let the other monitors run
+            await asyncio.sleep(0)
+        elif not text:
+            # Idle: back off the poll while no new lines are arriving, but wake up right at a shift boundary
+            delay = self.poll_interval
+            until_boundary = self.seconds_until_shift_boundary()
+            if until_boundary is not None:
+                delay = min(delay, until_boundary)
+            await asyncio.sleep(delay)
+            self.poll_interval = min(self.poll_interval * 2, MAX_POLL_INTERVAL)
+        return text
+
+    def record_part_file(self, part_file):
+        """Store the part file name detected during the setup phase."""
+        print(f"[{self.laser_id}] Part file detected: {part_file}")
+        self.current_phase["part_file"] = part_file
+
+    def record_tech_data(self, tech_data):
+        """Store the tech data recipe detected during the setup phase."""
+        self.current_phase["tech_data"] = tech_data
+        print(f"Tech data detected: {self.current_phase['tech_data']}")
+
+    def record_system_alarm(self, system_alarm, alarm_time=None):
+        """Count a system alarm against the current status, storing each distinct alarm once."""
+        if self.current_alarms.add(system_alarm, alarm_time):
+            print(f"[{self.laser_id}] Alarm stored: {system_alarm}")  # Repeats are only counted
+        self.alarm_counts.add(system_alarm)
+        self.bus.publish(AlarmRaised(self.laser_id, system_alarm, alarm_time))
+
+        # Add to the current runtime details
+        if self.current_runtime:
+            self.current_runtime[-1].set_details(self.current_alarms.entries)
+            self.queue_runtime_change(UPDATE, len(self.current_runtime) - 1)
+        return system_alarm
+
+    async def process_log_text(self, text):
+        """Classify a block of new log bytes in one pass and apply each event in order."""
+        started = time_module.perf_counter()
+        events = list(self.classifier.scan(text))  # Only the interesting lines, a handful per block
+        self.metrics.observe('classify_seconds', time_module.perf_counter() - started)
+
+        for event in events:
+            rule = event.rule
+            if rule.when is not None and self.current_status not in rule.when:
+                continue  # The rule does not apply in this status, e.g. tech data outside setup
+            new_status = rule.status
+
+            if self.skipping_exported:
+                # Only follow the status, up to the setup that finalized the runtime already exported
+                if new_status is None or new_status == self.current_status:
+                    continue
+                if new_status != 'Setup':
+                    self.current_status = new_status
+                    continue
+                self.skipping_exported = False
+
+            if new_status is not None and new_status != self.current_status:
+                # Stamp the change with the time it was logged, not the time we got to it
+                event_time = self.timestamps.parse(event.line) or self.last_log_time
+                if event_time and self.next_shift_boundary is not None:
+                    # Split at any shift boundary that passed before this change
+                    await self.check_shift_change(event_time)
+                if new_status == 'Setup':
+                    # Finalize the current runtime
+                    await self.finalize_current_runtime(end_time=event_time)
+                    # Start a new runtime
+                    self.start_new_runtime()
+                await self.add_runtime_line(new_status, start_time=event_time)
+
+            if rule.alarm:
+                self.record_system_alarm(event.value, self.timestamps.parse(event.line))
+            if rule.field == 'part_file':
+                if event.value:
+                    self.record_part_file(event.value)
+            elif rule.field == 'tech_data':
+                if event.value:
+                    self.record_tech_data(event.value)
+            if rule.counter == 'parts':
+                # Handle part count increase during cutting
+                self.session_part_count += 1
+                part_time = self.timestamps.parse(event.line) or self.last_log_time
+                if part_time:
+                    self.stats.record_part(part_time)
+                self.bus.publish(PartCounted(self.laser_id, part_time, self.session_part_count))
+
+        # Remember how far the log clock has got, from the last line of the block
+        last_line_start = text.rfind(b'\n', 0, len(text) - 1) + 1
+        last_line = text[last_line_start:last_line_start + 32].decode('ascii', errors='replace')
+        log_time = self.timestamps.parse(last_line)
+        if log_time:
+            self.last_log_time = log_time
+            self.last_log_monotonic = time_module.monotonic()
+
+    def log_clock_now(self):
+        """The time now on the controller's clock, which stamps the log lines and may be off from ours.
+
+        Runs on from the last log time by the monotonic time since, so the lines made up while the log is
+        quiet (the startup line, shift splits) are on the same clock as the status changes around them.
+        """
+        if self.last_log_time is None:
+            return datetime.now(timezone.utc).isoformat(timespec='seconds')  # No log clock to go by yet
+        elapsed = timedelta(seconds=time_module.monotonic() - self.last_log_monotonic)
+        return (datetime.fromisoformat(self.last_log_time) + elapsed).isoformat(timespec='seconds')
+
+    def calculate_duration(self, start_time, end_time):
+        start_time = start_time.replace('Z', '+00:00')
+        start = datetime.fromisoformat(start_time)
+        if end_time != 'Ongoing':
+            end_time = end_time.replace('Z', '+00:00')
+            end = datetime.fromisoformat(end_time)
+        else:
+            end = datetime.utcnow()
+        duration = end - start
+        return duration
+
+    def calculate_average_cutting_time(self):
+        """Calculate the average cutting time."""
+        if self.cutting_count > 0:
+            return self.total_cutting_duration / self.cutting_count
+        return timedelta()
+
+    def calculate_average_idle_time(self):
+        """Calculate the average idle time."""
+        if self.idle_count > 0:
+            return self.total_idle_duration / self.idle_count
+        return timedelta()
+
+    def queue_runtime_change(self, op, index=None):
+        """Remember a change to the current runtime so the next send carries it as a delta.
+
+        Each line is queued once however often it changes, and its latest state is read when the delta
+        is sent, so the outbox only grows with the number of lines touched while the server is away.
+        """
+        if self.snapshot_needed:
+            return  # The snapshot will carry this change
+        if op == RESET:
+            self.pending_ops = [(RESET, None)]  # Anything queued for the old runtime is moot
+        elif (op, index) not in self.pending_ops:
+            self.pending_ops.append((op, index))
+            if len(self.pending_ops) > MAX_PENDING_OPS:
+                # Cheaper to send the whole runtime once the server is back
+                self.pending_ops = []
+                self.snapshot_needed = True
+
+    def runtime_stats(self):
+        """Stats sent alongside the runtime in snapshots and deltas."""
+        return {
+            'avg_cutting_time': str(self.calculate_average_cutting_time()),  # Convert to string for JSON serialization
+            'avg_idle_time': str(self.calculate_average_idle_time()),        # Convert to string for JSON serialization
+            'bytes_behind': self.bytes_behind,                                # How far the monitor lags the log file
+        }
+
+    def stats_summary(self):
+        """Duration percentiles, utilization and parts per hour for the runtime messages."""
+        self.stats.changed = False
+        return self.stats.summary(
+            now=self.log_clock_now(),
+            cutting_since=self.start_time if self.current_status == 'Cutting' else None,
+        )
+
+    async def send_runtime(self, always=False):
+        """Send the runtime changes since the last send, or a full snapshot if the server needs one.
+
+        With always the delta goes out even if nothing changed: after a reconnect its sequence number
+        is what tells a server that restarted meanwhile to ask for a snapshot.
+        """
+        if not self.sio.connected:
+            return  # Keep the changes queued, they go out in one delta once we reconnect
+        if self.snapshot_needed:
+            await self.send_runtime_snapshot()
+            return
+        if not self.pending_ops and not always:
+            return
+
+        ops = []
+        for op, index in self.pending_ops:
+            if op == RESET:
+                ops.append({'op': op})
+            elif index < len(self.current_runtime):
+                ops.append({'op': op, 'index': index, 'line': self.current_runtime[index].to_dict()})
+        self.pending_ops = []
+        self.runtime_seq += 1
+
+        delta = {
+            'laser': self.laser_id,
+            'seq': self.runtime_seq,
+            'ops': ops,
+            **self.runtime_stats(),
+        }
+        if self.alarm_counts.changed:
+            # Only resent when an alarm was raised, the server keeps the last counts it was sent
+            delta['alarm_counts'] = self.alarm_counts.counts
+            self.alarm_counts.changed = False
+        if self.stats.changed:
+            delta['stats'] = self.stats_summary()  # Only after a line was finalized or a part counted
+        await self.emit_runtime('runtime_delta', delta, callback=self.on_runtime_ack)
+
+    async def send_runtime_snapshot(self):
+        """Send the entire current runtime to the server."""
+        self.snapshot_needed = False
+        self.pending_ops = []
+        self.runtime_seq += 1
+
+        await self.emit_runtime('runtime_update', {
+            'laser': self.laser_id,
+            'seq': self.runtime_seq,
+            'runtime': self.current_runtime.to_list(),
+            'alarm_counts': self.alarm_counts.counts,
+            'stats': self.stats_summary(),
+            **self.runtime_stats(),
+        })
+        self.alarm_counts.changed = False
+
+    async def emit_runtime(self, event, data, callback=None):
+        """Emit a runtime message, falling back to a snapshot if the connection drops under us."""
+        started = time_module.perf_counter()
+        try:
+            await self.sio.emit(event, data, callback=callback)
+        except socketio.exceptions.SocketIOError as e:
+            print(f"[{self.laser_id}] Could not send {event} ({e}), sending the full runtime once reconnected.")
+            self.snapshot_needed = True
+            return
+        self.metrics.observe('emit_seconds', time_module.perf_counter() - started)
+        self.metrics.count('emits_total')
+        self.heartbeat.emitted()
+
+    async def maybe_send_metrics(self):
+        """Report the monitor's metrics to the server every METRICS_INTERVAL seconds."""
+        now = time_module.monotonic()
+        if now - self.metrics.last_report < METRICS_INTERVAL or not self.sio.connected:
+            return
+        self.metrics.last_report = now
+        self.metrics.set('bytes_behind', self.bytes_behind)
+        self.metrics.set('seconds_since_last_line', round(now - self.heartbeat.last_progress, 1))
+        if self.heartbeat.last_emit is not None:
+            self.metrics.set('seconds_since_last_emit', round(now - self.heartbeat.last_emit, 1))
+        self.metrics.set('offline', 0 if self.offline_reason is None else 1)
+        self.metrics.counters['events_dropped_total'] = {sink.name: sink.dropped for sink in self.bus.sinks}
+        try:
+            await self.sio.emit('monitor_metrics', self.metrics.report(self.laser_id))
+        except socketio.exceptions.SocketIOError:
+            pass  # Only the latest report matters, the next one goes out once we reconnect
+
+    async def send_monitor_status(self):
+        """Tell the server whether our log is being read, so it shows an Offline laser instead of a stale status."""
+        if not self.sio.connected:
+            return  # Sent again once we reconnect
+        try:
+            await self.sio.emit('monitor_status', {
+                'laser': self.laser_id,
+                'status': 'Online' if self.offline_reason is None else 'Offline',
+                'reason': self.offline_reason,
+            })
+        except socketio.exceptions.SocketIOError:
+            pass  # Sent again once we reconnect
+
+    async def set_offline(self, reason, until_lines=False):
+        """Show the laser as Offline until its log is open again, or with until_lines until the log grows again."""
+        self.offline_reason = reason
+        self.offline_until_lines = until_lines
+        await self.send_monitor_status()
+
+    async def set_online(self):
+        if self.offline_reason is None:
+            return
+        print(f"[{self.laser_id}] Reading the log file.")
+        self.offline_reason = None
+        self.offline_until_lines = False
+        await self.send_monitor_status()
+
+    async def send_runtime_batch(self, events):
+        """Socket.IO sink: one send covers every change queued since the last one."""
+        await self.send_runtime()
+
+    async def journal_batch(self, events):
+        """Journal sink: append the lines finished since the last write to the current runtime's journal.
+
+        The lines only count as journaled (and can leave memory) once the write is done, so a checkpoint
+        never claims lines the file does not have. Lines left over by a failed write go with the next one.
+        """
+        runtime = self.current_runtime
+        data, count = runtime.journal_data()
+        if runtime.journal_path is None or not count:
+            return
+        await self.file_io.call(runtime.write_journal, data)
+        runtime.journal_written(len(data), count)
+        runtime.spill(MAX_RUNTIME_LINES, RUNTIME_LINES_KEPT)  # Lines read in a burst leave memory too
+
+    async def export_batch(self, events):
+        """Export sink: write each finalized runtime off the event loop, in the order they finished.
+
+        A runtime that cannot be written is retried until it is, no checkpoint gets past it meanwhile.
+        """
+        await self.bus.drain('journal')  # A journal write still running may be for one of these runtimes
+        for event in events:
+            delay = EXPORT_RETRY_MIN_DELAY
+            while True:
+                started = time_module.perf_counter()
+                try:
+                    await self.file_io.call(self.export_runtime, event.runtime_data)
+                    break
+                except Exception as e:
+                    print(f"[{self.laser_id}] Could not export the finalized runtime ({e}), retrying in {delay} seconds.")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, EXPORT_RETRY_MAX_DELAY)
+            self.metrics.observe('export_seconds', time_module.perf_counter() - started)
+
+    async def count_events(self, events):
+        """Metrics sink: count the published events by type."""
+        for event in events:
+            self.metrics.count('events_total', label=type(event).__name__)
+
+    def on_runtime_ack(self, response=None):
+        """The server answers a delta it could not apply (e.g. after a restart) by asking for a snapshot."""
+        if response and response.get('resync'):
+            print(f"[{self.laser_id}] Server missed runtime updates, resending the full runtime.")
+            self.snapshot_needed = True
+            asyncio.ensure_future(self.send_runtime())
+
+    async def add_runtime_line(self, new_status, start_time=None, end_time=None, session_part_count=0):
+        """Add a runtime line, update the current runtime, and have the sender send it."""
+        # Finalize the previous runtime line if necessary
+        if self.current_status != "unknown" and self.current_status != new_status:
+            self.finalize_runtime_line(end_time=start_time)
+            
+        # Create a new runtime line for the new status
+        self.start_time = start_time or self.log_clock_now()
+        shift_type = self.shift_schedule.shift_at(self.start_time)
+        new_runtime_line = RuntimeLine(
+            laser=self.laser_id,
+            status=new_status,
+            start_time=self.start_time,
+            part_file=self.current_phase.get("part_file"),
+            tech_data=self.current_phase.get("tech_data"),
+            session_part_count=session_part_count or self.session_part_count,
+            total_part_count=self.part_count,
+            shift_type=shift_type
+        )
+        self.current_runtime.append(new_runtime_line)
+        self.queue_runtime_change(APPEND, len(self.current_runtime) - 1)
+
+        # Update the current status, a line with the same status means a new shift
+        event_type = StatusChanged if new_status != self.current_status else ShiftChanged
+        self.current_status = new_status
+        
+        # Update the current shift type and when it ends
+        self.current_shift_type = shift_type
+        self.next_shift_boundary = self.shift_schedule.next_boundary(self.start_time)
+
+        # The sender sends the updated runtime once parsing gives it a turn
+        self.bus.publish(event_type(self.laser_id, new_status, self.start_time, shift_type))
+
+        # Lines already in the journal can leave memory, a delta still reads them back from there
+        self.current_runtime.spill(MAX_RUNTIME_LINES, RUNTIME_LINES_KEPT)
+
+    def finalize_runtime_line(self, end_time=None):
+        """Finalize the current runtime line by updating its end time and total duration."""
+        if self.current_runtime and self.current_runtime[-1].end_time == 'Ongoing':
+            current_time = end_time or self.log_clock_now()
+            duration = self.calculate_duration(self.start_time, current_time)
+            if duration < timedelta(0):
+                # The controller's clock was set back, a line cannot end before it started
+                current_time, duration = self.start_time, timedelta(0)
+            total_time = str(duration)
+            # Track total durations and counts for idle and cutting
+            if self.current_status == 'Cutting':
+                self.total_cutting_duration += duration
+                self.cutting_count += 1
+            elif self.current_status == 'Idle':
+                self.total_idle_duration += duration
+                self.idle_count += 1
+            if self.current_status in ('Cutting', 'Idle'):
+                self.stats.record_line(self.current_status, self.current_shift_type, self.start_time,
+                                       current_time, duration.total_seconds())
+            self.part_count += self.session_part_count
+            # Update the previous runtime line with an end time and part count
+            self.current_runtime[-1].finalize(
+                end_time=current_time,
+                total_time=total_time,
+                session_part_count=self.session_part_count,
+                total_part_count=self.part_count,
+                details=self.current_alarms.entries
+            )
+            self.queue_runtime_change(UPDATE, len(self.current_runtime) - 1)
+            self.current_alarms = LineAlarms()  # Clear alarms after sending
+            self.session_part_count = 0
+
+    async def finalize_current_runtime(self, end_time=None):
+        """Finalize the current runtime line and hand the runtime to the export sink."""
+        self.finalize_runtime_line(end_time=end_time)
+        if self.current_runtime:
+            self.bus.publish(RuntimeFinalized(self.laser_id, self.build_runtime_data()))
+            self.checkpoint_due = True
+
+    def build_runtime_data(self):
+        """Build the finalized runtime record in the shape the Salesforce uploader reads."""
+        avg_cutting_time = self.calculate_average_cutting_time()
+        avg_idle_time = self.calculate_average_idle_time()
+        return {
+            'laser': self.laser_id,
+            'equipment_name': self.equipment_name,
+            'part_file': self.current_phase.get("part_file"),
+            'tech_data': self.current_phase.get("tech_data"),
+            'total_cutting_duration': str(self.total_cutting_duration),
+            'total_idle_duration': str(self.total_idle_duration),
+            'cutting_count': self.cutting_count,
+            'idle_count': self.idle_count,
+            'avg_cutting_time': str(avg_cutting_time),
+            'avg_idle_time': str(avg_idle_time),
+            'total_part_count': self.part_count,
+            'runtime': self.current_runtime,
+        }
+
+    def export_path(self, journal_path):
+        """runtime_<laser>_<started>.jsonl.part is exported as finalized_runtime_<laser>_<started>.jsonl."""
+        return 'finalized_' + journal_path[:-len('.part')]
+
+    def runtime_was_exported(self, journal_path, journaled):
+        """Whether a checkpointed runtime was exported after the checkpoint, going by the files themselves."""
+        if not journal_path:
+            return False
+        path = self.export_path(journal_path)
+        # The uploader renames the file once it is sent
+        if os.path.exists(path) or os.path.exists(path + '.uploaded'):
+            return True
+        # The journal only exists once a line was written to it
+        return journaled > 0 and not os.path.exists(journal_path)
+
+    def export_runtime(self, runtime_data):
+        """Finish the runtime's journal and rename it to the uniquely named file the uploader watches."""
+        runtime = runtime_data['runtime']
+        if runtime.journal_path is None:
+            return  # Finished by an earlier attempt that outlived its timeout
+        summary = {key: value for key, value in runtime_data.items() if key != 'runtime'}
+        path = self.export_path(runtime.journal_path)
+        runtime.finish(summary, path)
+        print(f"[{self.laser_id}] Finalized runtime and wrote it to {path}.")
+
+    def new_runtime(self):
+        """Create an empty runtime with its own journal file, named after the time it started."""
+        started = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        return Runtime(journal_path=f'runtime_{self.laser_id}_{started}.jsonl.part')
+
+    def start_new_runtime(self):
+        """Start a new runtime by clearing previous data."""
+        print(f"[{self.laser_id}] Starting new runtime.")
+        self.current_runtime = self.new_runtime()  # Clear previous runtime data
+        self.queue_runtime_change(RESET)
+        self.current_alarms = LineAlarms()
+        self.part_count = 0
+        self.session_part_count = 0
+        self.total_cutting_duration = timedelta(0)  # Reset cutting duration
+        self.total_idle_duration = timedelta(0)     # Reset idle duration
+        self.cutting_count = 0                      # Reset cutting count
+        self.idle_count = 0                         # Reset idle count
+        
+    def get_state(self):
+        """Collect the in-memory monitor state so it can be checkpointed."""
+        return {
+            'current_status': self.current_status,
+            'start_time': self.start_time,
+            'part_count': self.part_count,
+            'session_part_count': self.session_part_count,
+            # Only the lines in memory, the others are in the journal up to journal_size
+            'current_runtime': [line.to_dict() for line in self.current_runtime.lines],
+            'runtime_journal': self.current_runtime.journal_path,
+            'runtime_spilled': self.current_runtime.spilled,
+            'runtime_journaled': self.current_runtime.journaled,
+            'runtime_journal_size': self.current_runtime.journal_size,
+            'current_alarms': self.current_alarms.entries,
+            'alarm_counts': self.alarm_counts.counts,
+            'stats': self.stats.to_dict(),
+            'total_cutting_duration': self.total_cutting_duration.total_seconds(),
+            'total_idle_duration': self.total_idle_duration.total_seconds(),
+            'cutting_count': self.cutting_count,
+            'idle_count': self.idle_count,
+            'current_shift_type': self.current_shift_type,
+            'current_phase': self.current_phase,
+            'last_log_time': self.last_log_time,
+            'skipping_exported': self.skipping_exported,
+        }
+
+    def restore_state(self, state, exported=False):
+        """Restore the monitor state saved by get_state; exported if its runtime was exported since."""
+        self.current_status = state['current_status']
+        self.start_time = state['start_time']
+        self.part_count = state['part_count']
+        self.session_part_count = state['session_part_count']
+        self.current_runtime = Runtime.from_list(
+            state['current_runtime'],
+            journal_path=state.get('runtime_journal') or self.new_runtime().journal_path,
+            spilled=state.get('runtime_spilled', 0),
+            journaled=state.get('runtime_journaled', 0),
+            journal_size=state.get('runtime_journal_size', 0),
+        )
+        self.current_alarms = LineAlarms(state['current_alarms'])
+        self.alarm_counts = AlarmFrequency(state.get('alarm_counts'))
+        self.stats = LaserStats.from_dict(state.get('stats'))
+        self.total_cutting_duration = timedelta(seconds=state['total_cutting_duration'])
+        self.total_idle_duration = timedelta(seconds=state['total_idle_duration'])
+        self.cutting_count = state['cutting_count']
+        self.idle_count = state['idle_count']
+        self.current_shift_type = state['current_shift_type']
+        if self.start_time:
+            self.next_shift_boundary = self.shift_schedule.next_boundary(self.start_time)
+        self.current_phase = state['current_phase']
+        self.last_log_time = state.get('last_log_time')
+        self.last_log_monotonic = time_module.monotonic()  # Behind by the downtime until the next line comes
+        self.snapshot_needed = True  # After a restart the server may have lines the checkpoint does not
+        self.skipping_exported = state.get('skipping_exported', False)
+        if exported:
+            # Exported after this checkpoint was written, so the log up to the setup that started the next
+            # runtime is already in the uploader's file. Read through it without adding it to any runtime.
+            print(f"[{self.laser_id}] The checkpointed runtime was already exported, "
+                  f"skipping its lines up to the next setup.")
+            self.start_new_runtime()
+            self.skipping_exported = True
+        if self.skipping_exported:
+            self.next_shift_boundary = None  # No shift lines either, the next setup starts the runtime again
+
+    async def maybe_write_checkpoint(self, reader):
+        """Write a checkpoint right after a runtime was finalized, or once new lines were read and the interval passed."""
+        if not self.bus.idle('export'):
+            return  # Not past a runtime that has not been exported yet, checkpointed once it has
+        if self.checkpoint_due:
+            await self.checkpoint(reader)  # Right away, the old checkpoint points at the journal just renamed
+            return
+        if self.applied_offset == self.last_checkpoint_offset:
+            return
+        if time_module.monotonic() - self.last_checkpoint_time >= CHECKPOINT_INTERVAL:
+            await self.checkpoint(reader)
+
+    async def checkpoint(self, reader):
+        """Write a checkpoint once every runtime finalized before it has been exported, else keep the last one."""
+        # Otherwise a restart would resume past a runtime whose file was never written
+        try:
+            await asyncio.wait_for(self.bus.drain('export'), EXPORT_WAIT)
+        except asyncio.TimeoutError:
+            print(f"[{self.laser_id}] A finalized runtime has not been exported yet, keeping the last checkpoint.")
+            return
+        fingerprint = await self.file_io.call(reader.fingerprint)
+        # The state is collected and serialized here on the event loop, only the write runs off it
+        offset = self.applied_offset  # Not reader.offset, a block may have been read but not applied yet
+        text = dump_checkpoint({
+            'laser': self.laser_id,
+            'filename': self.filename,
+            'offset': offset,
+            'fingerprint': fingerprint,
+            'state': self.get_state(),
+        })
+        due, self.checkpoint_due = self.checkpoint_due, False  # A runtime finalized during the write needs another
+        try:
+            await self.file_io.call(save_checkpoint, self.checkpoint_path, text)
+        except Exception:
+            self.checkpoint_due = self.checkpoint_due or due
+            raise
+        self.last_checkpoint_time = time_module.monotonic()
+        self.last_checkpoint_offset = offset
+
+    def find_resume_point(self, reader):
+        """Load the checkpoint and seek to where this file is to be read from, blocking file I/O.
+
+        Returns (state, offset, whether the state's runtime was exported since), or None without a
+        checkpoint for this file.
+        """
+        checkpoint = load_checkpoint(self.checkpoint_path)
+        if checkpoint is None:
+            return None
+        if checkpoint.get('filename') != self.filename:
+            print(f"[{self.laser_id}] Checkpoint is for a different log file, ignoring it.")
+            return None
+        offset = checkpoint.get('offset', 0)
+        if reader.size() < offset or not reader.matches_fingerprint(checkpoint['fingerprint']):
+            # Rotated while we were down, keep the runtime and read the new file from its start
+            print(f"[{self.laser_id}] Log file was rotated since the checkpoint, reading it from the start.")
+            offset = 0
+        reader.seek(offset)
+        state = checkpoint['state']
+        exported = self.runtime_was_exported(state.get('runtime_journal'), state.get('runtime_journaled', 0))
+        return state, offset, exported
+
+    async def resume_from_checkpoint(self, reader):
+        """Seek to the checkpointed offset and restore state if the checkpoint matches this file."""
+        resume_point = await self.file_io.call(self.find_resume_point, reader)
+        if resume_point is None:
+            return False
+        state, offset, exported = resume_point
+        # Back on the event loop, the sinks read the fields the state goes into
+        self.restore_state(state, exported)
+        self.last_checkpoint_offset = offset
+        return True
+
+    async def find_recovery_offset(self, reader):
+        """Where to start reading so the runtime in progress is rebuilt from the log, searching back from
+        the read position. Returns None if the tail of the log has no status line."""
+        end = reader.offset
+        rules = self.classifier.rules
+        # A counted part only says the laser is cutting, the cycle start before it says since when
+        status_line = await self.rfind_line(reader, [rule.marker for rule in rules if rule.status and not rule.counter],
+                                            end, RECOVERY_SCAN_LIMIT)
+        if status_line is None:
+            status_line = await self.rfind_line(reader, [rule.marker for rule in rules if rule.status],
+                                                end, RECOVERY_SCAN_LIMIT)
+        if status_line is None:
+            return None
+        # The runtime started at the last setup, whose lines also give the part file and tech data
+        setup_line = await self.rfind_line(reader, [rule.marker for rule in rules if rule.status == 'Setup'],
+                                           end, SETUP_SCAN_LIMIT)
+        if setup_line is None:
+            return status_line
+        if end - setup_line <= RECOVERY_SCAN_LIMIT:
+            return setup_line
+        # Too far back to read it all again, only take the part file and tech data from the setup
+        self.recover_setup(await self.file_io.call(reader.read_at, setup_line, RECOVERY_SETUP_SIZE))
+        return status_line
+
+    async def rfind_line(self, reader, markers, end, limit):
+        """Offset of the last line before end with any of the markers, searching back at most limit bytes.
+
+        Each block is its own file I/O call, so a slow share times out one block read rather than the
+        whole scan, and no abandoned read keeps using the file handle for long.
+        """
+        stop = max(end - limit, 0)
+        while end is not None:
+            line, end = await self.file_io.call(reader.rfind_line, markers, end, stop)
+            if line is not None:
+                return line
+        return None
+
+    def recover_setup(self, text):
+        """Take the part file and tech data from the log bytes starting at a setup line."""
+        for event in self.classifier.scan(text):
+            rule = event.rule
+            if rule.status not in (None, 'Setup'):
+                break  # Setup is over
+            if rule.field and event.value:
+                self.current_phase[rule.field] = event.value
+
+    async def check_rotation(self, reader):
+        """Switch to the new log file if the controller rotated or truncated the one we are reading."""
+        # A shrunken file shows up on every read, the path and header checks cost a round trip to the share
+        if not reader.truncated() and time_module.monotonic() - self.last_rotation_check < ROTATION_CHECK_INTERVAL:
+            return
+        self.last_rotation_check = time_module.monotonic()
+        reason = await self.file_io.call(reader.file_changed)
+        if reason is None:
+            return
+
+        print(f"[{self.laser_id}] Log file was {reason}, reopening it.")
+        if reason == 'replaced':
+            # The old handle still reaches the rotated file, finish the lines written to it first
+            while True:
+                text = await self.file_io.call(reader.read_block)
+                if text:
+                    await self.process_log_text(text)
+                elif reader.bytes_behind == 0:
+                    break
+        tail = reader.read_remaining()
+        if tail:
+            await self.process_log_text(tail)
+
+        await self.file_io.call(reader.reopen)
+        self.applied_offset = reader.offset
+        # Checkpoint the new file right away so a restart does not look for the old offset in it
+        await self.checkpoint(reader)
+
+    async def check_shift_change(self, current_time=None):
+        """Check if a shift boundary has passed and split the runtime line exactly at it."""
+        if self.skipping_exported:
+            return  # No runtime to split until the next setup
+        current_time = current_time or self.log_clock_now()
+        if self.next_shift_boundary is None:
+            # First check since startup, start a line in the current shift
+            await self.add_runtime_line(self.current_status, start_time=current_time)
+            return
+        # Timestamps compare as strings, so there is no datetime work until a boundary is crossed
+        splits = 0
+        while current_time >= self.next_shift_boundary:
+            boundary = self.next_shift_boundary
+            splits += 1
+            if splits > len(self.shift_schedule.starts):
+                # More than a day of shifts passed with no log lines, skip straight to the current shift
+                boundary = self.shift_schedule.window_at(current_time)[0]
+            # Finalize the current runtime line
+            self.finalize_runtime_line(end_time=boundary)
+            # Start a new runtime line with the same status but new shift type
+            await self.add_runtime_line(self.current_status, start_time=boundary)
+
+    def seconds_until_shift_boundary(self):
+        """Seconds until the next shift boundary on the log clock, or None if it is not known yet."""
+        if self.next_shift_boundary is None:
+            return None
+        boundary = datetime.fromisoformat(self.next_shift_boundary)
+        return max((boundary - datetime.fromisoformat(self.log_clock_now())).total_seconds(), 0)
+
+    async def monitor_log_file(self):
+        """Continuously monitor the log file for status updates, raising if it cannot be read."""
+        await self.check_file_exists()  # Ensure the file exists before starting
+
+        # Every blocking call on the (network) log file runs on the file I/O thread pool
+        reader = LogReader(self.filename)
+        await self.file_io.call(reader.open)
+        self.applied_offset = None  # Nothing from this reader is applied until it is positioned
+        try:
+            if await self.resume_from_checkpoint(reader):
+                # Replay whatever was written while we were down, at catch-up speed
+                print(f"[{self.laser_id}] Resuming from checkpoint at byte {reader.offset}.")
+            else:
+                await self.file_io.call(reader.seek_to_end)  # Move to the end of the file
+                # Rather than waiting for the next status line, read the current runtime back from the log
+                offset = await self.find_recovery_offset(reader)
+                if offset is None:
+                    print(f"[{self.laser_id}] Started tailing the log file.")
+                else:
+                    await self.file_io.call(reader.seek, offset)
+                    print(f"[{self.laser_id}] Rebuilding the current runtime from byte {offset}, then tailing the log file.")
+            self.applied_offset = reader.offset
+            if not self.offline_until_lines:
+                await self.set_online()
+
+            while True:
+                self.heartbeat.beat()
+                text = await self.read_log_block(reader)
+                if text:
+                    await self.process_log_text(text)
+                    # Check for shift change on the log clock while lines are arriving
+                    await self.check_shift_change(self.last_log_time)
+                elif self.bytes_behind == 0:
+                    # Check for shift change on the log clock run on while the log is idle
+                    await self.check_shift_change()
+                    await self.check_rotation(reader)
+                self.applied_offset = reader.offset  # The block is fully applied, it can be checkpointed
+
+                await self.maybe_write_checkpoint(reader)
+                await self.maybe_send_metrics()
+                self.classifier.maybe_reload()
+        finally:
+            # Leaving partway through a block (it raised, or we were cancelled while reading it) the state holds
+            # only some of its lines, and leaving before the reader was positioned (a recovery scan that timed
+            # out) nothing was rebuilt yet: either way the last checkpoint is the one to restart from
+            if reader.offset == self.applied_offset:
+                try:
+                    await self.checkpoint(reader)
+                except OSError as e:
+                    print(f"[{self.laser_id}] Could not write checkpoint: {e}")
+            try:
+                await self.file_io.call(reader.close)
+            except OSError as e:
+                print(f"[{self.laser_id}] Could not close the log file: {e}")
+
+
+    async def run(self):
+        try:
+            # Connect to the Flask-SocketIO server unless a supervisor shares its connection with us.
+            # Reconnecting runs alongside, the log keeps being parsed while the server is away.
+            if self.owns_connection:
+                self.connection_task = asyncio.ensure_future(keep_connected(self.sio, self.server_url))
+            self.bus.start()
+
+            # Continuously monitor the log file, restarted with backoff whenever it fails or stalls
+            await MonitorWatchdog(self, self.quiet_limits).run()
+
+        except KeyboardInterrupt:
+            print("Interrupted by user, disconnecting...")
+            if self.owns_connection:
+                await self.sio.disconnect()
@@ -0,0 +1,317 @@
+import socketio
+import asyncio
+import argparse
+import json
+import multiprocessing
+import queue
+from functools import partial
+
+from connection import create_client, keep_connected
+from lasermonitor import LaserLogMonitor
+from logclassifier import DEFAULT_RULES_FILE, LineClassifier
+from runtimedelta import apply_runtime_delta, snapshot_state
+from shiftschedule import ShiftSchedule
+
+DEFAULT_CONFIG = 'lasers.json'
+WORKER_RESTART_DELAY = 5  # Seconds to wait before restarting a crashed worker
+
+
+def load_laser_config(config_path):
+    """Load the laser list (laser_id, equipment_name, filename, server_url) and shifts from the config file."""
+    with open(config_path, 'r') as file:
+        config = json.load(file)
+    lasers = config.get('lasers', [])
+    for laser in lasers:
+        missing = [key for key in ('laser_id', 'equipment_name', 'filename', 'server_url') if not laser.get(key)]
+        if missing:
+            raise ValueError(f"Laser entry {laser} in {config_path} is missing {', '.join(missing)}")
+        quiet_limits = laser.get('quiet_limits')
+        if quiet_limits is not None and not (
+                isinstance(quiet_limits, dict) and all(isinstance(v, (int, float)) for v in quiet_limits.values())):
+            raise ValueError(f"quiet_limits of {laser['laser_id']} in {config_path} must map statuses to seconds")
+    for shift in config.get('shifts') or []:
+        missing = [key for key in ('name', 'start') if not shift.get(key)]
+        if missing:
+            raise ValueError(f"Shift entry {shift} in {config_path} is missing {', '.join(missing)}")
+    try:
+        ShiftSchedule(config.get('shifts'))  # Every start must be HH:MM, and no two shifts may start together
+    except ValueError as e:
+        raise ValueError(f"Shifts in {config_path}: {e}") from e
+    return config
+
+
+class LaserSupervisor:
+    def __init__(self, lasers, shifts=None, rules_path=DEFAULT_RULES_FILE):
+        self.lasers = lasers
+        self.clients = {}  # One shared Socket.IO client per server url
+        self.monitors = []
+        classifier = LineClassifier(rules_path)  # Compiled once and shared (and reloaded) for every monitor
+        shift_schedule = ShiftSchedule(shifts)
+
+        for laser in lasers:
+            sio = self.get_client(laser['server_url'])
+            self.monitors.append(LaserLogMonitor(
+                laser_id=laser['laser_id'],
+                equipment_name=laser['equipment_name'],
+                filename=laser['filename'],
+                server_url=laser['server_url'],
+                sio=sio,
+                classifier=classifier,
+                shift_schedule=shift_schedule,
+                quiet_limits=laser.get('quiet_limits')
+            ))
+
+    def get_client(self, server_url):
+        """Return the shared Socket.IO client for a server, creating it on first use."""
+        if server_url not in self.clients:
+            sio = create_client()
+
+            async def on_connect(server_url=server_url):
+                print(f"Connected to server at {server_url}")
+                asyncio.ensure_future(self.on_connected(server_url))
+
+            async def on_disconnect(server_url=server_url):
+                print(f"Disconnected from server at {server_url}")
+
+            sio.on('connect', handler=on_connect)
+            sio.on('disconnect', handler=on_disconnect)
+            self.clients[server_url] = sio
+        return self.clients[server_url]
+
+    async def on_connected(self, server_url):
+        """Flush what each monitor on this server queued while the connection was down."""
+        for monitor in self.monitors:
+            if monitor.server_url == server_url:
+                monitor.metrics.count('connects_total')
+                await monitor.send_runtime(always=True)  # Even with nothing queued, a restarted server needs to resync
+                await monitor.send_monitor_status()
+
+    def keep_clients_connected(self):
+        return [keep_connected(sio, server_url) for server_url, sio in self.clients.items()]
+
+    async def run(self):
+        try:
+            # Keep each shared connection up in the background and run every monitor as a task on this loop
+            print(f"Supervising {len(self.monitors)} lasers: {', '.join(m.laser_id for m in self.monitors)}")
+            await asyncio.gather(*self.keep_clients_connected(), *(monitor.run() for monitor in self.monitors))
+
+        finally:
+            for sio in self.clients.values():
+                await sio.disconnect()
+
+
+class QueueEmitter:
+    """Stands in for a Socket.IO client inside a worker process and forwards emits to the parent."""
+
+    def __init__(self, event_queue, server_url):
+        self.event_queue = event_queue
+        self.server_url = server_url
+
+    connected = True  # The queue is always there, the parent holds changes while its server is away
+
+    def on(self, event, handler=None):
+        pass  # The parent owns the real connection and its handlers
+
+    async def emit(self, event, data=None, callback=None):
+        # Serialize now, the queue pickles in a background thread while the monitor keeps mutating its runtime.
+        # Acks are handled by the parent, which resends snapshots from its own copy of each runtime.
+        self.event_queue.put((self.server_url, event, json.dumps(data, default=str)))
+
+
+def run_worker(lasers, event_queue, shifts=None, rules_path=DEFAULT_RULES_FILE):
+    """Worker process entry point: run one shard of monitors on its own asyncio loop."""
+    async def run_shard():
+        classifier = LineClassifier(rules_path)
+        shift_schedule = ShiftSchedule(shifts)
+        monitors = [
+            LaserLogMonitor(
+                laser_id=laser['laser_id'],
+                equipment_name=laser['equipment_name'],
+                filename=laser['filename'],
+                server_url=laser['server_url'],
+                sio=QueueEmitter(event_queue, laser['server_url']),
+                classifier=classifier,
+                shift_schedule=shift_schedule,
+                quiet_limits=laser.get('quiet_limits')
+            )
+            for laser in lasers
+        ]
+        await asyncio.gather(*(monitor.run() for monitor in monitors))
+
+    try:
+        asyncio.run(run_shard())
+    except KeyboardInterrupt:
+        pass
+
+
+class ShardedSupervisor(LaserSupervisor):
+    """Spread the monitors across worker processes; the parent owns every server connection."""
+
+    def __init__(self, lasers, workers, shifts=None, rules_path=DEFAULT_RULES_FILE):
+        self.lasers = lasers
+        self.shifts = shifts
+        self.rules_path = rules_path
+        LineClassifier(rules_path)  # Fail here on a bad rules file rather than in every worker
+        self.clients = {}
+        self.monitors = []
+        for laser in lasers:
+            self.get_client(laser['server_url'])
+
+        workers = max(1, min(workers, len(lasers)))
+        lasers_per_worker = -(-len(lasers) // workers)  # Ceiling division
+        self.shards = [lasers[i:i + lasers_per_worker] for i in range(0, len(lasers), lasers_per_worker)]
+        self.processes = [None] * len(self.shards)
+        self.forwarders = [None] * len(self.shards)  # Relays each worker's own queue, a killed worker only breaks its own
+        self.runtimes = {}  # Latest runtime per laser, kept in step with the deltas passing through
+        self.unsent = set()  # (server_url, laser_id) with changes that arrived while the server was away
+        self.connects = {}  # Server URL -> connections made, reported in the workers' metrics
+        self.statuses = {}  # (server_url, laser_id) -> latest monitor_status, resent after reconnecting
+
+    def start_worker(self, index):
+        shard = self.shards[index]
+        if self.forwarders[index] is not None:
+            # The old queue may hold half a message from the worker that died, its reader could wait on it forever
+            self.forwarders[index].cancel()
+        event_queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(shard, event_queue, self.shifts, self.rules_path),
+            name=f"laser-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+        self.forwarders[index] = asyncio.ensure_future(self.forward_events(event_queue))
+        print(f"Started worker {index} (pid {process.pid}) for {', '.join(l['laser_id'] for l in shard)}")
+
+    async def forward_events(self, event_queue):
+        """Relay runtime events from one worker's queue to the server connections."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                server_url, event, payload = await loop.run_in_executor(None, event_queue.get, True, 1)
+            except queue.Empty:
+                continue
+            data = json.loads(payload)
+            laser_id = data.get('laser')
+
+            callback = None
+            if event == 'runtime_update':
+                self.runtimes[laser_id] = snapshot_state(data)
+            elif event == 'runtime_delta':
+                apply_runtime_delta(self.runtimes.get(laser_id), data)
+                callback = partial(self.on_runtime_ack, server_url, laser_id)
+            elif event == 'monitor_status':
+                self.statuses[(server_url, laser_id)] = data
+                if not self.clients[server_url].connected:
+                    continue  # The latest one goes out once we reconnect
+            elif event == 'monitor_metrics':
+                # The workers never see the connection, fill in its count here
+                data['counters']['connects_total'] = self.connects.get(server_url, 0)
+                if not self.clients[server_url].connected:
+                    continue  # Only the latest report matters, nothing to resend later
+
+            sio = self.clients[server_url]
+            if (server_url, laser_id) in self.unsent or not sio.connected:
+                # The copy above has it all, one snapshot per laser goes out once we reconnect
+                self.unsent.add((server_url, laser_id))
+                continue
+            try:
+                await sio.emit(event, data, callback=callback)
+            except socketio.exceptions.SocketIOError as e:
+                print(f"[{laser_id}] Could not send {event} ({e}), sending the full runtime once reconnected.")
+                self.unsent.add((server_url, laser_id))
+
+    async def on_connected(self, server_url):
+        """Send a snapshot and the status of every laser on this server, it may have restarted while we were away.
+
+        The workers number their own deltas, so a snapshot (which keeps the laser's sequence number) is
+        the one resync message we can send for them.
+        """
+        self.connects[server_url] = self.connects.get(server_url, 0) + 1
+        for key in [key for key in self.unsent if key[0] == server_url]:
+            self.unsent.discard(key)
+        for laser in self.lasers:
+            laser_id = laser['laser_id']
+            if laser['server_url'] == server_url and laser_id in self.runtimes:
+                await self.clients[server_url].emit('runtime_update', {'laser': laser_id, **self.runtimes[laser_id]})
+        for key, status in self.statuses.items():
+            if key[0] == server_url:
+                await self.clients[server_url].emit('monitor_status', status)
+
+    def on_runtime_ack(self, server_url, laser_id, response=None):
+        """Resend the full runtime when the server reports a gap in a laser's deltas."""
+        if response and response.get('resync') and laser_id in self.runtimes:
+            print(f"[{laser_id}] Server missed runtime updates, resending the full runtime.")
+            snapshot = {'laser': laser_id, **self.runtimes[laser_id]}
+            asyncio.ensure_future(self.clients[server_url].emit('runtime_update', snapshot))
+
+    async def mark_offline(self, lasers, reason):
+        """Show lasers as Offline on the dashboard, their monitors report Online again once they read the log."""
+        for laser in lasers:
+            key = (laser['server_url'], laser['laser_id'])
+            self.statuses[key] = {'laser': laser['laser_id'], 'status': 'Offline', 'reason': reason}
+            sio = self.clients[laser['server_url']]
+            if not sio.connected:
+                continue  # Sent once we reconnect
+            try:
+                await sio.emit('monitor_status', self.statuses[key])
+            except socketio.exceptions.SocketIOError:
+                pass  # Sent once we reconnect
+
+    async def watch_workers(self):
+        """Restart any worker that has died without touching the others."""
+        while True:
+            await asyncio.sleep(1)
+            for forwarder in self.forwarders:
+                if forwarder.done() and not forwarder.cancelled():
+                    forwarder.result()  # Relaying failed, stop the supervisor rather than drop events silently
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    print(f"Worker {index} exited with code {process.exitcode}, restarting in {WORKER_RESTART_DELAY} seconds...")
+                    process.join()
+                    await self.mark_offline(self.shards[index], f"Worker exited with code {process.exitcode}")
+                    await asyncio.sleep(WORKER_RESTART_DELAY)
+                    self.start_worker(index)
+
+    async def run(self):
+        try:
+            for index in range(len(self.shards)):
+                self.start_worker(index)
+
+            print(f"Supervising {len(self.lasers)} lasers across {len(self.shards)} worker processes")
+            await asyncio.gather(*self.keep_clients_connected(), self.watch_workers())
+
+        finally:
+            for forwarder in self.forwarders:
+                if forwarder is not None:
+                    forwarder.cancel()
+            for process in self.processes:
+                if process is not None and process.is_alive():
+                    process.terminate()
+            for sio in self.clients.values():
+                await sio.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every laser log monitor from one supervisor.")
+    parser.add_argument('config', nargs='?', default=DEFAULT_CONFIG, help="Path to the laser config file")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of worker processes to spread the monitors across (default: run in this process)")
+    args = parser.parse_args()
+
+    config = load_laser_config(args.config)
+    workers = args.workers if args.workers is not None else config.get('workers', 1)
+    rules_path = config.get('rules') or DEFAULT_RULES_FILE
+    if workers > 1:
+        supervisor = ShardedSupervisor(config['lasers'], workers, config.get('shifts'), rules_path)
+    else:
+        supervisor = LaserSupervisor(config['lasers'], config.get('shifts'), rules_path)
+    try:
+        asyncio.run(supervisor.run())
+    except KeyboardInterrupt:
+        print("Interrupted by user, stopping supervisor...")
+
+
+if __name__ == '__main__':
+    main()
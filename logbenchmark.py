@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+import tempfile
+import tracemalloc
+
+from logclassifier import LineClassifier
+from loggenerator import generate_log, parse_size
+from logreader import LogReader, MAX_BLOCK_SIZE
+from logreplay import ReplayMonitor
+
+
+def classifier_benchmark(path):
+    """LineClassifier.scan over the log, already in memory in read-sized blocks of raw bytes."""
+    blocks = []
+    with open(path, 'rb') as file:
+        carry = b''
+        while True:
+            data = file.read(MAX_BLOCK_SIZE)
+            if not data:
+                break
+            data = carry + data
+            end = data.rfind(b'\n') + 1
+            blocks.append(data[:end])
+            carry = data[end:]
+    lines = sum(block.count(b'\n') for block in blocks)
+    size = sum(len(block) for block in blocks)
+    classifier = LineClassifier()
+
+    def run():
+        for block in blocks:
+            for event in classifier.scan(block):
+                pass
+        return lines, size
+    return run
+
+
+def reader_benchmark(path):
+    """LogReader reading the whole file from disk in blocks of complete lines."""
+    def run():
+        lines = 0
+        with LogReader(path, block_size=MAX_BLOCK_SIZE) as reader:
+            while True:
+                text = reader.read_block()
+                if text:
+                    lines += text.count(b'\n')
+                elif reader.bytes_behind == 0:
+                    break
+            return lines, reader.offset
+    return run
+
+
+def replay_benchmark(path):
+    """Classify the log and build every runtime, as logreplay.py does, writing the runtimes nowhere."""
+    with open(path, 'rb') as file:
+        lines = sum(block.count(b'\n') for block in iter(lambda: file.read(MAX_BLOCK_SIZE), b''))
+
+    def run():
+        # The monitor's progress messages still get formatted, but stay out of the results
+        with open(os.devnull, 'wb') as output, open(os.devnull, 'w') as quiet:
+            with contextlib.redirect_stdout(quiet), contextlib.redirect_stderr(quiet):
+                monitor = ReplayMonitor('bench', None, output)
+                asyncio.run(monitor.replay([path]))
+        return lines, monitor.bytes_read
+    return run
+
+
+BENCHMARKS = {
+    'classifier': classifier_benchmark,
+    'reader': reader_benchmark,
+    'replay': replay_benchmark,
+}
+
+
+def run_benchmark(setup, path, repeat):
+    """Best of repeat timed runs, then one more run under tracemalloc for the peak memory."""
+    run = setup(path)
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        lines, size = run()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'lines': lines,
+        'seconds': round(best, 3),
+        'lines_per_second': round(lines / best),
+        'mb_per_second': round(size / (1024 * 1024) / best, 1),
+        'peak_memory_mb': round(peak / (1024 * 1024), 1),
+    }
+
+
+def compare_results(results, baseline, tolerance):
+    """Print how each benchmark moved against a saved baseline and return the regressions."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        speed = result['lines_per_second'] / previous['lines_per_second'] - 1
+        # Memory is only compared once it is big enough for the change to mean something
+        memory = (result['peak_memory_mb'] - previous['peak_memory_mb']) / max(previous['peak_memory_mb'], 1)
+        slower = speed < -tolerance
+        bigger = memory > tolerance
+        flag = '  REGRESSION' if slower or bigger else ''
+        print(f"{name:<12} lines/s {speed:+7.1%}   peak memory {memory:+7.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure lines/s and peak memory of the log parsing hot paths.")
+    parser.add_argument('--log', default=None, help="Log file to benchmark on (default: generate a synthetic one)")
+    parser.add_argument('--size', default='50MB', help="Size of the generated log (default: 50MB)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the generated log")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per benchmark, the best one counts")
+    parser.add_argument('--only', action='append', choices=BENCHMARKS, help="Run only this benchmark (repeatable)")
+    parser.add_argument('--save', default=None, help="Write the results to this JSON file, to compare against later")
+    parser.add_argument('--compare', default=None, help="Baseline JSON file written by --save")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="Slowdown or memory growth against the baseline that counts as a regression (default: 0.1)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.abspath(args.log) if args.log else os.path.join(workdir, 'lcsystem_log.txt')
+        if not args.log:
+            generator = generate_log(path, parse_size(args.size), seed=args.seed)
+            print(f"Generated {os.path.getsize(path) / (1024 * 1024):.1f} MB, {generator.counts['lines']} lines",
+                  file=sys.stderr)
+
+        # The replay writes its journal to the working directory
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            results = {}
+            for name in args.only or BENCHMARKS:
+                results[name] = result = run_benchmark(BENCHMARKS[name], path, args.repeat)
+                print(f"{name:<12} {result['lines_per_second']:>12,} lines/s {result['mb_per_second']:>8.1f} MB/s "
+                      f"{result['peak_memory_mb']:>8.1f} MB peak ({result['lines']:,} lines in {result['seconds']}s)")
+        finally:
+            os.chdir(cwd)
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=4)
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)
+        if compare_results(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
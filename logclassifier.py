@@ -0,0 +1,207 @@
+import os
+import re
+import json
+import time
+from collections import namedtuple
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logrules.json')
+RULES_CHECK_INTERVAL = 5  # Seconds between checks of the rules file for changes
+
+# What a rule can produce
+STATUSES = ('Setup', 'Cutting', 'Idle')
+FIELDS = ('part_file', 'tech_data')
+COUNTERS = ('parts',)
+
+# A classified log line: the rule it matched, the value pulled out of it and the decoded line
+LineEvent = namedtuple('LineEvent', ['rule', 'value', 'line'])
+
+
+class LogRule:
+    """One entry of the rules file: which lines it matches and what a match produces.
+
+    A rule matches lines with its level and source fields whose message starts with its message,
+    or, with 'contains', lines holding that phrase anywhere. A match can change the status, set a
+    field from the first group of its pattern, count a part and raise an alarm. 'when' limits the
+    rule to the statuses listed.
+    """
+
+    __slots__ = ('name', 'key', 'message', 'marker', 'status', 'field', 'counter', 'alarm', 'pattern', 'when')
+
+    def __init__(self, spec):
+        self.name = spec.get('name') or spec.get('contains') or spec.get('message')
+        if spec.get('contains'):
+            self.key = None  # Matched anywhere in a line
+            self.message = spec['contains']
+            self.marker = self.message
+        elif spec.get('level') and spec.get('source'):
+            self.key = f"|{spec['level']}|{spec['source']}|"
+            self.message = spec.get('message', '')
+            self.marker = self.key + self.message
+        else:
+            raise ValueError(f"Rule {self.name!r} needs 'contains', or 'level' and 'source'")
+
+        self.status = spec.get('status')
+        self.field = spec.get('field')
+        self.counter = spec.get('counter')
+        self.alarm = bool(spec.get('alarm'))
+        self.when = frozenset(spec['when']) if spec.get('when') else None
+        try:
+            self.pattern = re.compile(spec['pattern']) if spec.get('pattern') else None
+        except re.error as e:
+            raise ValueError(f"Rule {self.name!r} has an invalid pattern: {e}")
+
+        if self.status is not None and self.status not in STATUSES:
+            raise ValueError(f"Rule {self.name!r} has unknown status {self.status!r}, expected one of {STATUSES}")
+        if self.field is not None and self.field not in FIELDS:
+            raise ValueError(f"Rule {self.name!r} has unknown field {self.field!r}, expected one of {FIELDS}")
+        if self.counter is not None and self.counter not in COUNTERS:
+            raise ValueError(f"Rule {self.name!r} has unknown counter {self.counter!r}, expected one of {COUNTERS}")
+        if self.when is not None and not self.when <= set(STATUSES):
+            raise ValueError(f"Rule {self.name!r} has unknown statuses in 'when', expected some of {STATUSES}")
+        if not (self.status or self.field or self.counter or self.alarm):
+            raise ValueError(f"Rule {self.name!r} produces nothing, give it a status, field, counter or alarm")
+
+    def extract(self, line, marker_end):
+        """The value a matching line carries: the pattern's first group, or else the rest of the line."""
+        if self.pattern is None:
+            return line[marker_end:].strip()
+        match = self.pattern.search(line)
+        if match is None:
+            return None
+        return match.group(1) if match.re.groups else match.group()
+
+
+def load_rules(path):
+    """Read and check a rules file, raising ValueError if any rule is invalid."""
+    with open(path, 'r') as file:
+        specs = json.load(file).get('rules')
+    if not specs:
+        raise ValueError(f"{path} has no rules")
+    return [LogRule(spec) for spec in specs]
+
+
+class LineClassifier:
+    """Find the interesting lines in a block of raw log bytes in one pass and turn each into a LineEvent.
+
+    Log lines are "timestamp|level|source|message". The rules are compiled into one table keyed on
+    "|level|source|" and one of phrases, and each block is swept once per key and phrase at C speed, so
+    adding rules costs nothing for the chatter lines. Only the lines that match are decoded. The first
+    rule in the file that matches a line wins, wherever in the line the other matches are.
+    """
+
+    def __init__(self, rules_path=DEFAULT_RULES_FILE, encoding='utf-8'):
+        self.rules_path = rules_path
+        self.encoding = encoding
+        self.rules_mtime = os.path.getmtime(rules_path)
+        self.last_rules_check = time.monotonic()
+        self.compile(load_rules(rules_path))
+
+    def compile(self, rules):
+        """Build the lookup tables for a rule set."""
+        dispatch = {}  # b'|level|source|' -> [(message prefix, rule index, rule)]
+        phrases = {}   # Phrase matched anywhere in a line -> (rule index, rule)
+        for index, rule in enumerate(rules):
+            if rule.key is None:
+                phrases.setdefault(rule.message.encode(self.encoding), (index, rule))
+            else:
+                dispatch.setdefault(rule.key.encode(self.encoding), []).append(
+                    (rule.message.encode(self.encoding), index, rule))
+        # Swapped in together, between two scans
+        self.rules, self.dispatch, self.phrases = rules, dispatch, phrases
+
+    def maybe_reload(self):
+        """Pick up an edited rules file, looking at it at most every RULES_CHECK_INTERVAL seconds.
+
+        A rules file that does not load is reported and the current rules stay in use.
+        """
+        now = time.monotonic()
+        if now - self.last_rules_check < RULES_CHECK_INTERVAL:
+            return False
+        self.last_rules_check = now
+        try:
+            mtime = os.path.getmtime(self.rules_path)
+        except OSError:
+            return False  # Being replaced, look again next time
+        if mtime == self.rules_mtime:
+            return False
+
+        self.rules_mtime = mtime
+        try:
+            rules = load_rules(self.rules_path)
+        except (OSError, ValueError) as e:
+            print(f"Could not reload log rules from {self.rules_path} ({e}), keeping the current rules.")
+            return False
+        self.compile(rules)
+        print(f"Reloaded {len(rules)} log rules from {self.rules_path}.")
+        return True
+
+    def scan(self, block):
+        """Yield a LineEvent for each interesting line in a block of log bytes, in order."""
+        # Sweep the block once per (level, source) and phrase with bytes.find, which runs at C speed
+        # and is far cheaper than stepping the regex engine (or Python) through every chatter line
+        hits = []
+        find = block.find
+        for key, messages in self.dispatch.items():
+            size = len(key)
+            pos = find(key)
+            while pos != -1:
+                hits.append((pos, pos + size, messages))
+                pos = find(key, pos + size)
+        for phrase, indexed_rule in self.phrases.items():
+            size = len(phrase)
+            pos = find(phrase)
+            while pos != -1:
+                hits.append((pos, pos + size, indexed_rule))
+                pos = find(phrase, pos + size)
+        if not hits:
+            return
+        hits.sort(key=lambda hit: hit[0])
+
+        line_start = line_end = -1
+        best = None  # (rule index, rule, marker end) of the first rule in the file matching the current line
+        for pos, marker_end, match in hits:
+            if pos >= line_end:
+                # First hit on a new line, the line before it is settled
+                if best is not None:
+                    event = self.line_event(block, line_start, line_end, best[1], best[2])
+                    if event is not None:
+                        yield event
+                    best = None
+                line_start = block.rfind(b'\n', 0, pos) + 1
+                line_end = find(b'\n', pos)
+                if line_end == -1:
+                    line_end = len(block)
+            if isinstance(match, list):
+                # Only the level and source fields count, not the same text inside a message
+                if find(b'|', line_start, pos) != -1:
+                    continue
+                for message, index, rule in match:
+                    if block.startswith(message, marker_end):
+                        marker_end += len(message)
+                        break
+                else:
+                    continue
+            else:
+                index, rule = match
+            if best is None or index < best[0]:
+                best = (index, rule, marker_end)
+        if best is not None:
+            event = self.line_event(block, line_start, line_end, best[1], best[2])
+            if event is not None:
+                yield event
+
+    def line_event(self, block, start, end, rule, marker_end):
+        """Decode the line of a block between start and end that matched a rule, and build its event."""
+        # Only the interesting lines are decoded, a bad byte becomes U+FFFD instead of an error
+        line = block[start:end].decode(self.encoding, errors='replace')
+        prefix = block[start:marker_end].decode(self.encoding, errors='replace')
+        return self.build_event(rule, line, len(prefix))
+
+    def build_event(self, rule, line, marker_end):
+        """Pull the value out of a line that matched a rule."""
+        value = None
+        if rule.field or rule.alarm:
+            value = rule.extract(line, marker_end)
+            if value is None and not (rule.status or rule.counter):
+                return None  # Nothing to record without the value
+        return LineEvent(rule, value, line)
@@ -0,0 +1,169 @@
+import os
+import sys
+import random
+import argparse
+from datetime import datetime, timezone
+
+# Routine lines that make up most of a real log, none of them change the status
+NOISE_LINES = [
+    "Info|Motion|Axis X moved to position 123.456 mm feed 2000",
+    "Info|Motion|Axis Y moved to position 87.250 mm feed 2000",
+    "Info|Gas Control|Pressure set to 12.0 bar",
+    "Info|Gas Control|Gas type N2 flow ok",
+    "Debug|ACS Controller|Buffer 3 status ok heartbeat",
+    "Debug|Laser Source|Power 4000 W duty 100 %",
+    "Info|Height Control|Nozzle gap 1.0 mm in tolerance",
+]
+ALARMS = [
+    "Gas pressure low",
+    "Door open",
+    "Chiller flow low",
+    "Nozzle collision detected",
+    "Beam path purge fault",
+]
+RECIPES = ['Steel_3mm', 'Stainless_2mm', 'Aluminium_5mm', 'Mild_10mm']
+SIZE_UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+def parse_size(text):
+    """Parse a size such as 500KB, 100MB or 2GB (a plain number is bytes)."""
+    text = text.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+class LogGenerator:
+    """Write synthetic lcsystem_log text: setups, each followed by cutting cycles and idle periods.
+
+    The status-changing lines are the ones LineClassifier looks for, everything in between is routine
+    noise with the occasional system alarm. Every choice comes from one seeded random generator, so
+    the same settings always produce the same file.
+    """
+
+    def __init__(self, seed=0, start=None, line_interval=0.1, cycles_per_setup=5, parts_per_cycle=5,
+                 lines_per_part=50, idle_lines=200, alarm_rate=0.001, storm_rate=0.005, storm_lines=2000):
+        self.random = random.Random(seed)
+        start = start or datetime(2024, 5, 1, 5, 0, tzinfo=timezone.utc)
+        self.millis = int(start.timestamp() * 1000)  # Log clock, in milliseconds since the epoch
+        self.step = max(int(line_interval * 1000), 1)
+        self.cycles_per_setup = cycles_per_setup
+        self.parts_per_cycle = parts_per_cycle
+        self.lines_per_part = lines_per_part
+        self.idle_lines = idle_lines
+        self.alarm_rate = alarm_rate    # Chance of any routine line being a system alarm instead
+        self.storm_rate = storm_rate    # Chance of a cutting cycle raising an alarm storm
+        self.storm_lines = storm_lines  # Alarms in one storm
+        self.second = None
+        self.prefix = ''  # Date and time up to the second, only formatted when the second changes
+        self.counts = {'lines': 0, 'setups': 0, 'cycles': 0, 'parts': 0, 'alarms': 0, 'storms': 0}
+
+    def line(self, entry):
+        """One log line for 'level|source|message', stamped with the log clock, which then moves on."""
+        second, millis = divmod(self.millis, 1000)
+        if second != self.second:
+            self.second = second
+            self.prefix = datetime.fromtimestamp(second, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self.millis += self.step
+        self.counts['lines'] += 1
+        return f"{self.prefix}.{millis:03d}|{entry}\n"
+
+    def noise(self, count):
+        for _ in range(count):
+            if self.random.random() < self.alarm_rate:
+                self.counts['alarms'] += 1
+                yield self.line(f"Error|System Alarm|{self.random.choice(ALARMS)}")
+            else:
+                yield self.line(self.random.choice(NOISE_LINES))
+
+    def storm(self):
+        """The same alarm raised over and over in quick succession."""
+        alarm = self.random.choice(ALARMS)
+        self.counts['storms'] += 1
+        self.counts['alarms'] += self.storm_lines
+        for _ in range(self.storm_lines):
+            yield self.line(f"Error|System Alarm|{alarm}")
+
+    def lines(self):
+        """Yield log lines forever."""
+        while True:
+            self.counts['setups'] += 1
+            part_file = f"part{self.counts['setups']:05d}.nc"
+            yield self.line(f"Info|ACS Controller|Downloading Part Program C:\\Parts\\{part_file}")
+            yield self.line(f"Info|Tech|Downloading TechData Recipe '{self.random.choice(RECIPES)}'")
+            yield from self.noise(self.idle_lines // 4)
+
+            for _ in range(self.cycles_per_setup):
+                self.counts['cycles'] += 1
+                cycle_started = self.millis
+                yield self.line("Info|Button Pressed|Cycle Start")
+                if self.random.random() < self.storm_rate:
+                    yield from self.storm()
+                for _ in range(self.parts_per_cycle):
+                    yield from self.noise(self.lines_per_part)
+                    self.counts['parts'] += 1
+                    yield self.line("Info|Cutting|Validating full cutting area")
+                seconds = (self.millis - cycle_started) // 1000
+                yield self.line(f"Info|Process State|Total processing time {seconds}")
+                yield from self.noise(self.idle_lines)
+
+    def write(self, file, size, chunk_size=1024 * 1024):
+        """Write whole lines to a binary file until it has grown by at least size bytes."""
+        written = 0
+        chunk = []
+        chunk_bytes = 0
+        for line in self.lines():
+            chunk.append(line)
+            chunk_bytes += len(line)  # The lines are ASCII, so characters are bytes
+            if chunk_bytes >= chunk_size or written + chunk_bytes >= size:
+                file.write(''.join(chunk).encode('ascii'))
+                written += chunk_bytes
+                chunk = []
+                chunk_bytes = 0
+                if written >= size:
+                    return written
+
+
+def generate_log(path, size, **settings):
+    """Write a synthetic log file of about size bytes and return the generator with its counts."""
+    generator = LogGenerator(**settings)
+    with open(path, 'wb') as file:
+        generator.write(file, size)
+    return generator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic lcsystem_log file for replays and benchmarks.")
+    parser.add_argument('path', help="Log file to write")
+    parser.add_argument('--size', default='100MB', help="Size of the file, e.g. 500KB, 100MB or 2GB (default: 100MB)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed, the same seed writes the same file")
+    parser.add_argument('--line-interval', type=float, default=0.1, help="Seconds of log time between lines")
+    parser.add_argument('--cycles-per-setup', type=int, default=5, help="Cutting cycles after each part program download")
+    parser.add_argument('--parts-per-cycle', type=int, default=5, help="Parts counted in each cutting cycle")
+    parser.add_argument('--lines-per-part', type=int, default=50, help="Routine lines logged while cutting one part")
+    parser.add_argument('--idle-lines', type=int, default=200, help="Routine lines logged while idle after a cycle")
+    parser.add_argument('--alarm-rate', type=float, default=0.001, help="Share of routine lines that are system alarms")
+    parser.add_argument('--storm-rate', type=float, default=0.005, help="Share of cutting cycles that raise an alarm storm")
+    parser.add_argument('--storm-lines', type=int, default=2000, help="Alarms logged in one alarm storm")
+    args = parser.parse_args()
+
+    size = parse_size(args.size)
+    generator = generate_log(
+        args.path, size,
+        seed=args.seed,
+        line_interval=args.line_interval,
+        cycles_per_setup=args.cycles_per_setup,
+        parts_per_cycle=args.parts_per_cycle,
+        lines_per_part=args.lines_per_part,
+        idle_lines=args.idle_lines,
+        alarm_rate=args.alarm_rate,
+        storm_rate=args.storm_rate,
+        storm_lines=args.storm_lines,
+    )
+    counts = ', '.join(f"{count} {name}" for name, count in generator.counts.items())
+    print(f"Wrote {os.path.getsize(args.path) / (1024 * 1024):.1f} MB to {args.path}: {counts}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
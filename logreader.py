@@ -0,0 +1,181 @@
+import os
+import hashlib
+
+MIN_BLOCK_SIZE = 64 * 1024         # Read size once we have caught up with the end of the file
+DEFAULT_BLOCK_SIZE = 256 * 1024
+MAX_BLOCK_SIZE = 4 * 1024 * 1024   # Read size cap while working through a large backlog
+FINGERPRINT_SIZE = 1024            # Bytes at the head of the file used to recognise it again
+
+
+class LogReader:
+    """Read a growing log file in large byte blocks and hand back only complete lines."""
+
+    def __init__(self, filename, block_size=DEFAULT_BLOCK_SIZE, min_block_size=MIN_BLOCK_SIZE,
+                 max_block_size=MAX_BLOCK_SIZE, encoding='utf-8'):
+        self.filename = filename
+        self.block_size = block_size
+        self.min_block_size = min_block_size
+        self.max_block_size = max_block_size
+        self.encoding = encoding
+        self.file = None
+        self.offset = 0            # Byte offset just past the last complete line handed out
+        self.carry = b''           # Incomplete trailing line waiting for the rest of its bytes
+        self.bytes_behind = 0      # How far the last read left us behind the end of the file
+        self.file_size = 0         # Size of the open file as of the last read
+        self.head = None           # Fingerprint of the head of the file when it was opened
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        self.file = open(self.filename, 'rb')
+        self.carry = b''
+        self.offset = 0
+        self.file_size = self.size()
+        self.head = self.fingerprint()
+
+    def reopen(self):
+        """Drop the old handle and start again at the beginning of whatever file is at the path now."""
+        self.close()
+        self.open()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def seek(self, offset):
+        """Continue reading from a byte offset, which should be the start of a line."""
+        self.file.seek(offset)
+        self.offset = offset
+        self.carry = b''
+
+    def seek_to_end(self):
+        """Skip everything already in the file and only read lines written from now on."""
+        self.seek(self.file.seek(0, 2))
+
+    def read_header(self, size):
+        """Read the first bytes of the file without moving the read position."""
+        position = self.file.tell()
+        try:
+            self.file.seek(0)
+            return self.file.read(size)
+        finally:
+            self.file.seek(position)
+
+    def fingerprint(self):
+        """Identify the file by a hash of its first bytes, which survives reopening over a share."""
+        header = self.read_header(FINGERPRINT_SIZE)
+        return {
+            'header_size': len(header),
+            'header_hash': hashlib.sha1(header).hexdigest(),
+        }
+
+    def matches_fingerprint(self, fingerprint):
+        """Check whether the open file is the one a fingerprint was taken from."""
+        header = self.read_header(fingerprint['header_size'])
+        return (len(header) == fingerprint['header_size']
+                and hashlib.sha1(header).hexdigest() == fingerprint['header_hash'])
+
+    def read_at(self, offset, size):
+        """Read up to size bytes from an offset without moving the read position."""
+        position = self.file.tell()
+        try:
+            self.file.seek(offset)
+            return self.file.read(size)
+        finally:
+            self.file.seek(position)
+
+    def rfind_line(self, markers, end, stop):
+        """One step of a backward search for the start of the last line before end with any of the markers.
+
+        Reads the block before end, no further back than stop, trimmed to whole lines so a marker is
+        never split between two steps. Returns (line offset, None) if a line was found, (None, the end
+        to search next) if not, and (None, None) once there is nothing left to search. Does not move
+        the read position.
+        """
+        markers = [marker.encode(self.encoding) for marker in markers]
+        start = max(end - self.max_block_size, stop)
+        data = self.read_at(start, end - start)
+        first_line = 0
+        if start > 0:
+            first_line = data.find(b'\n') + 1  # The first line is only partly in this block
+            if first_line == 0:
+                return None, None  # A line longer than a whole block, this is not a log we know
+        found = max(data.rfind(marker, first_line) for marker in markers)
+        if found != -1:
+            return start + data.rfind(b'\n', 0, found) + 1, None
+        if start == stop:
+            return None, None
+        return None, start + first_line
+
+    def size(self):
+        return os.fstat(self.file.fileno()).st_size
+
+    def truncated(self):
+        """True if the last read found the file shorter than what we have already read from it."""
+        return self.file_size < self.offset + len(self.carry)
+
+    def file_changed(self):
+        """Return why the file at our path is no longer the one we are reading ('truncated',
+        'replaced' or 'rewritten'), or None if it is still the same file."""
+        open_stat = os.fstat(self.file.fileno())
+        if open_stat.st_size < self.offset + len(self.carry):
+            return 'truncated'
+
+        try:
+            path_stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None  # Moved away and the new file is not there yet, keep reading the old one
+        # Some network shares report no file id, only compare them when both sides have one
+        if path_stat.st_ino and open_stat.st_ino and \
+                (path_stat.st_ino, path_stat.st_dev) != (open_stat.st_ino, open_stat.st_dev):
+            return 'replaced'
+
+        # Truncated and written past our offset again between two checks
+        if not self.matches_fingerprint(self.head):
+            return 'rewritten'
+        if self.head['header_size'] < FINGERPRINT_SIZE and open_stat.st_size > self.head['header_size']:
+            self.head = self.fingerprint()  # The head was still being written when we took it
+        return None
+
+    def read_block(self):
+        """Read the next block of complete lines as raw bytes, or b'' if no complete line is available.
+
+        Decoding is left to the classifier, which only decodes the few lines it is interested in.
+        """
+        data = self.file.read(self.block_size)
+        self.file_size = self.size()
+        position = self.offset + len(self.carry) + len(data)
+        self.bytes_behind = max(self.file_size - position, 0)
+        self.adjust_block_size(len(data))
+        if not data:
+            return b''
+
+        data = self.carry + data
+        last_newline = data.rfind(b'\n')
+        if last_newline == -1:
+            self.carry = data  # Still waiting for the end of the line
+            return b''
+        self.carry = data[last_newline + 1:]
+        lines = data[:last_newline + 1]
+        self.offset += len(lines)
+        return lines
+
+    def read_remaining(self):
+        """Hand back a final line that never got its newline, for when nothing more will be written."""
+        tail = self.carry
+        self.offset += len(tail)
+        self.carry = b''
+        return tail
+
+    def adjust_block_size(self, bytes_read):
+        """Grow the read size while far behind the end of the file and shrink it once caught up."""
+        if bytes_read == self.block_size and self.bytes_behind >= self.block_size:
+            self.block_size = min(self.block_size * 2, self.max_block_size)
+        elif self.bytes_behind == 0 and self.block_size > self.min_block_size:
+            self.block_size = max(self.block_size // 2, self.min_block_size)
@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import asyncio
+import json
+import argparse
+
+from lasermonitor import LaserLogMonitor
+from logclassifier import DEFAULT_RULES_FILE, LineClassifier
+from logreader import LogReader, MAX_BLOCK_SIZE
+from runtimemodel import Runtime, write_runtime_data
+from shiftschedule import ShiftSchedule
+
+
+class NullEmitter:
+    """Stands in for the Socket.IO client when replaying, so nothing is sent anywhere."""
+
+    connected = True
+
+    def on(self, event, handler=None):
+        pass
+
+    async def emit(self, event, data=None, callback=None):
+        pass
+
+
+class ReplayMonitor(LaserLogMonitor):
+    """Parse existing log files from the start at disk speed and write out every finalized runtime."""
+
+    def __init__(self, laser_id, equipment_name, output, classifier=None, shift_schedule=None):
+        self.journal_count = 0  # Numbers the replay journals, the first one is made while initializing
+        super().__init__(laser_id, equipment_name, filename=None, server_url=None,
+                         sio=NullEmitter(), classifier=classifier, shift_schedule=shift_schedule)
+        self.output = output
+        self.runtime_count = 0
+        self.bytes_read = 0
+
+    def new_runtime(self):
+        """Give each replayed runtime its own journal, apart from the journals of a live monitor.
+
+        A finalized runtime is written out by the export sink after parsing has moved on, so the
+        next runtime cannot reuse its journal.
+        """
+        self.journal_count += 1
+        return Runtime(journal_path=f'replay_journal_{self.laser_id}_{self.journal_count}.jsonl.part')
+
+    def export_runtime(self, runtime_data):
+        """Write the finalized runtime as one JSON line instead of overwriting the uploader's file."""
+        write_runtime_data(self.output, runtime_data)
+        self.output.write(b'\n')
+        self.runtime_count += 1
+        runtime_data['runtime'].discard_journal()
+
+    async def replay_file(self, path):
+        """Parse one log file from offset 0 without any pauses."""
+        with LogReader(path, block_size=MAX_BLOCK_SIZE) as reader:
+            while True:
+                text = reader.read_block()
+                if text:
+                    await self.process_log_text(text)
+                    await self.check_shift_change(self.last_log_time)
+                    await asyncio.sleep(0)  # Let the journal and export sinks keep up, or every line stays in memory
+                elif reader.bytes_behind == 0:
+                    break
+            tail = reader.read_remaining()
+            if tail:
+                await self.process_log_text(tail)
+            self.bytes_read += reader.offset
+
+    async def replay(self, paths):
+        """Replay log files in order, carrying the runtime across them, then finalize the last one."""
+        self.bus.start()
+        for path in paths:
+            print(f"[{self.laser_id}] Replaying {path}", file=sys.stderr)
+            await self.replay_file(path)
+        await self.finalize_current_runtime(end_time=self.last_log_time)
+        await self.bus.stop()
+        self.current_runtime.discard_journal()
+
+
+def list_log_files(path):
+    """Return the log file itself, or every file in an archive directory oldest first."""
+    if not os.path.isdir(path):
+        return [path]
+    files = [os.path.join(path, name) for name in os.listdir(path)]
+    files = [file for file in files if os.path.isfile(file)]
+    return sorted(files, key=lambda file: (os.path.getmtime(file), file))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild runtimes from an existing lcsystem_log file or archive directory.")
+    parser.add_argument('path', help="Log file, or a directory of archived log files")
+    parser.add_argument('--laser-id', required=True, help="Laser id to stamp on the runtimes, e.g. ipgB")
+    parser.add_argument('--equipment-name', default=None, help="Salesforce equipment id for the laser")
+    parser.add_argument('--output', default=None,
+                        help="JSON lines file to write the runtimes to (default: replayed_runtimes_<laser_id>.jsonl)")
+    parser.add_argument('--config', default=None,
+                        help="Laser config to take the shift times and rules file from (default: built-in shifts and logrules.json)")
+    args = parser.parse_args()
+
+    shifts = None
+    rules_path = DEFAULT_RULES_FILE
+    if args.config:
+        with open(args.config, 'r') as file:
+            config = json.load(file)
+        shifts = config.get('shifts')
+        rules_path = config.get('rules') or rules_path
+
+    output_path = args.output or f'replayed_runtimes_{args.laser_id}.jsonl'
+    paths = list_log_files(args.path)
+
+    started = time.perf_counter()
+    with open(output_path, 'wb') as output:
+        monitor = ReplayMonitor(args.laser_id, args.equipment_name, output, classifier=LineClassifier(rules_path),
+                                shift_schedule=ShiftSchedule(shifts))
+        asyncio.run(monitor.replay(paths))
+    elapsed = time.perf_counter() - started
+
+    megabytes = monitor.bytes_read / (1024 * 1024)
+    print(f"[{args.laser_id}] Replayed {megabytes:.1f} MB from {len(paths)} file(s) in {elapsed:.1f}s "
+          f"({megabytes / max(elapsed, 1e-9):.1f} MB/s), wrote {monitor.runtime_count} runtimes to {output_path}",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,14 @@ from gevent import monkey
 monkey.patch_all()
 
 import os
-from flask import Flask, render_template
+import time
+from flask import Flask, Response, jsonify, render_template
 from flask_socketio import SocketIO, emit, join_room
 
+from alarmcounts import fleet_alarm_table
+from metrics import render_prometheus
+from runtimedelta import apply_runtime_delta, snapshot_state
+
 # Initialize Flask app and SocketIO
 app = Flask(__name__,
             template_folder=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates'),
@@ -14,9 +19,25 @@ app = Flask(__name__,
 # Initialize SocketIO with gevent
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='gevent')
 
-# Store the full runtime (sequence of status updates) for each laser
+# Store the full runtime (sequence of status updates) and its last sequence number for each laser
 laser_runtimes = {}
 
+# Latest metrics report from each laser's monitor, and when it arrived
+laser_metrics = {}
+laser_metrics_time = {}
+
+# Lasers whose monitor is not reading its log file, shown as Offline instead of their last status
+laser_offline = {}
+
+def dashboard_status(laser_id):
+    """The status the dashboard shows for a laser: Offline, or the status of its latest runtime line."""
+    if laser_id in laser_offline:
+        return 'Offline'
+    state = laser_runtimes.get(laser_id)
+    if state and state['runtime']:
+        return state['runtime'][-1]['status']
+    return 'unknown'
+
 @app.route('/')
 def index():
     return render_template('LaserdashboardhomeV5flask.html')
@@ -25,6 +46,20 @@ def index():
 def laser_page(laser_id):
     return render_template(f'{laser_id}.html', laser_id=laser_id)
 
+@app.route('/alarms')
+def alarm_table():
+    """How often each alarm has been raised, across every laser, most frequent first."""
+    return jsonify(fleet_alarm_table({
+        laser_id: state.get('alarm_counts') for laser_id, state in laser_runtimes.items()
+    }))
+
+@app.route('/metrics')
+def metrics():
+    """Each monitor's latest metrics in the Prometheus text format."""
+    now = time.time()
+    ages = {laser_id: now - received for laser_id, received in laser_metrics_time.items()}
+    return Response(render_prometheus(laser_metrics, ages), mimetype='text/plain; version=0.0.4')
+
 @socketio.on('connect')
 def handle_connect():
 
@@ -35,14 +70,18 @@ def handle_connect():
             room = laser_id
             join_room(room)
 
-            # Send initial data
+            # Send the full runtime to the client that joined, deltas follow through the room
             if laser_id in laser_runtimes:
                 emit('runtime_message', {
                     'laser': laser_id,
+                    'seq': laser_runtimes[laser_id]['seq'],
                     'runtime': laser_runtimes[laser_id]['runtime'],
                     'avg_cutting_time': laser_runtimes[laser_id].get('avg_cutting_time', 'N/A'),
-                    'avg_idle_time': laser_runtimes[laser_id].get('avg_idle_time', 'N/A')
-                }, room=room)
+                    'avg_idle_time': laser_runtimes[laser_id].get('avg_idle_time', 'N/A'),
+                    'stats': laser_runtimes[laser_id].get('stats')
+                })
+            if laser_id in laser_offline:
+                emit('monitor_status', laser_offline[laser_id])
         else:
             room = 'dashboard'
             join_room(room)
@@ -52,37 +91,83 @@ def handle_connect():
                 emit('runtime_message', {
                     'laser': laser_id,
                     'runtime': runtime['runtime']
-                }, room=room)
+                })
+            for laser_id in laser_offline:
+                emit('runtime_message', {'laser': laser_id, 'status': 'Offline'})
 
 @socketio.on('runtime_update')
 def handle_runtime_update(data):
+    """A monitor sent its full runtime (on startup, or after we asked for a resync)."""
     laser_id = data['laser']
     runtime = data.get('runtime', [])
-    avg_cutting_time = data.get('avg_cutting_time')
-    avg_idle_time = data.get('avg_idle_time')
 
     if not isinstance(runtime, list):
         return
 
-    laser_runtimes[laser_id] = {
-        'runtime': runtime,
-        'avg_cutting_time': avg_cutting_time,
-        'avg_idle_time': avg_idle_time
-    }
+    laser_runtimes[laser_id] = snapshot_state(data)
+    state = laser_runtimes[laser_id]
 
     # Emit the updated data to the laser room
     emit('runtime_message', {
         'laser': laser_id,
-        'runtime': runtime,
-        'avg_cutting_time': avg_cutting_time,
-        'avg_idle_time': avg_idle_time
+        'seq': state['seq'],
+        'runtime': state['runtime'],
+        'avg_cutting_time': state['avg_cutting_time'],
+        'avg_idle_time': state['avg_idle_time'],
+        'stats': state['stats']
     }, room=laser_id)
 
     # Also emit the update to the dashboard room
-    emit('runtime_message', {
-        'laser': laser_id,
-        'runtime': runtime,
-    }, room='dashboard')
+    if laser_id in laser_offline:
+        emit('runtime_message', {'laser': laser_id, 'status': 'Offline'}, room='dashboard')
+    else:
+        emit('runtime_message', {
+            'laser': laser_id,
+            'runtime': state['runtime'],
+        }, room='dashboard')
+
+@socketio.on('runtime_delta')
+def handle_runtime_delta(data):
+    """A monitor sent only what changed in its runtime since its last message."""
+    laser_id = data['laser']
+    state = laser_runtimes.get(laser_id)
+
+    if not apply_runtime_delta(state, data):
+        # We missed a message (e.g. this server restarted), ask the monitor for its full runtime
+        return {'resync': True}
+
+    # Pass the delta on to the laser room, the pages keep their own copy of the runtime
+    emit('runtime_delta', data, room=laser_id)
+
+    # The dashboard only needs the most recent status
+    if state['runtime']:
+        emit('runtime_message', {
+            'laser': laser_id,
+            'status': dashboard_status(laser_id),
+        }, room='dashboard')
+
+@socketio.on('monitor_status')
+def handle_monitor_status(data):
+    """A monitor stopped reading its log file (Offline) or is reading it again (Online)."""
+    laser_id = data.get('laser')
+    if not laser_id:
+        return
+    if data.get('status') == 'Offline':
+        laser_offline[laser_id] = data
+    else:
+        laser_offline.pop(laser_id, None)
+
+    # Nobody should be looking at the color of a status the monitor can no longer see change
+    emit('runtime_message', {'laser': laser_id, 'status': dashboard_status(laser_id)}, room='dashboard')
+    emit('monitor_status', data, room=laser_id)
+
+@socketio.on('monitor_metrics')
+def handle_monitor_metrics(data):
+    """A monitor reported its counters and latencies, kept for the /metrics scrape."""
+    laser_id = data.get('laser')
+    if laser_id:
+        laser_metrics[laser_id] = data
+        laser_metrics_time[laser_id] = time.time()
 
 if __name__ == '__main__':
     # Use SocketIO to run the app (with gevent for concurrency)
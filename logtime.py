@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+
+
+class LogTimestampParser:
+    """Turn the timestamp at the start of a log line into a UTC ISO string, reusing work across lines.
+
+    Lines are expected to start with a local controller time as "YYYY-MM-DD HH:MM:SS" ("T" and
+    "/" separators are also accepted) or "MM/DD/YYYY HH:MM:SS"; anything after the seconds is ignored.
+    """
+
+    def __init__(self):
+        self.last_key = None    # Timestamp prefix (to the second) of the last parsed line
+        self.last_value = None
+        self.day_key = None     # Date prefix of the last parsed line
+        self.day = None         # (year, month, day) for day_key
+
+    def parse(self, line):
+        """Return the line's timestamp as a UTC ISO string, or None if the line has no timestamp."""
+        key = line[:19]
+        if key == self.last_key:
+            return self.last_value  # Same second as the previous line
+        value = self.parse_key(key)
+        if value is not None:
+            self.last_key = key
+            self.last_value = value
+        return value
+
+    def parse_key(self, key):
+        try:
+            day_key = key[:10]
+            if day_key != self.day_key:
+                if key[4] in '-/':
+                    day = (int(key[0:4]), int(key[5:7]), int(key[8:10]))
+                elif key[2] == '/':
+                    day = (int(key[6:10]), int(key[0:2]), int(key[3:5]))
+                else:
+                    return None
+                self.day_key = day_key
+                self.day = day
+            if key[10] not in ' T' or key[13] != ':' or key[16] != ':':
+                return None
+            local_time = datetime(*self.day, int(key[11:13]), int(key[14:16]), int(key[17:19]))
+        except (ValueError, IndexError):
+            return None
+        # The controller logs in local time, the same zone as the machine running the monitor
+        return local_time.astimezone(timezone.utc).isoformat(timespec='seconds')
@@ -0,0 +1,116 @@
+from bisect import bisect_left
+
+METRICS_INTERVAL = 10  # Seconds between metrics reports from a monitor
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+# name -> (type, help) for everything a monitor reports, in the order they are rendered
+METRICS = {
+    'lines_total': ('counter', 'Log lines read'),
+    'bytes_total': ('counter', 'Log bytes read'),
+    'emits_total': ('counter', 'Runtime messages sent to the server'),
+    'connects_total': ('counter', 'Connections (first connect and reconnects) to the server'),
+    'events_total': ('counter', 'Events published by the log parser, by type'),
+    'events_dropped_total': ('counter', 'Events a sink dropped because its queue was full, by sink'),
+    'restarts_total': ('counter', 'Restarts of a failed or stalled log loop or sink, by reason'),
+    'bytes_behind': ('gauge', 'Bytes between the read position and the end of the log file'),
+    'seconds_since_last_line': ('gauge', 'Seconds since the monitor last read a new log line'),
+    'seconds_since_last_emit': ('gauge', 'Seconds since the monitor last sent a runtime message'),
+    'offline': ('gauge', '1 while the log file is not being read and the laser shows as Offline'),
+    'classify_seconds': ('histogram', 'Time to classify one block of log text'),
+    'emit_seconds': ('histogram', 'Time to send one runtime message'),
+    'export_seconds': ('histogram', 'Time to write one finalized runtime'),
+}
+# Counters kept per label value
+METRIC_LABELS = {'events_total': 'event', 'events_dropped_total': 'sink', 'restarts_total': 'reason'}
+
+
+class Histogram:
+    """Prometheus-style histogram: a count per bucket plus the sum and count of every value observed."""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {'counts': self.counts, 'sum': self.sum, 'count': self.count}
+
+
+class MonitorMetrics:
+    """Counters, gauges and latency histograms for one laser's monitor, reported to the server."""
+
+    def __init__(self):
+        self.counters = {name: {} if name in METRIC_LABELS else 0
+                         for name, (kind, _) in METRICS.items() if kind == 'counter'}
+        self.gauges = {name: 0 for name, (kind, _) in METRICS.items() if kind == 'gauge'}
+        self.histograms = {name: Histogram() for name, (kind, _) in METRICS.items() if kind == 'histogram'}
+        self.last_report = 0  # Monotonic time of the last report sent
+
+    def count(self, name, amount=1, label=None):
+        if label is None:
+            self.counters[name] += amount
+        else:
+            counts = self.counters[name]
+            counts[label] = counts.get(label, 0) + amount
+
+    def observe(self, name, seconds):
+        self.histograms[name].observe(seconds)
+
+    def set(self, name, value):
+        self.gauges[name] = value
+
+    def report(self, laser_id):
+        return {
+            'laser': laser_id,
+            'counters': {name: dict(value) if isinstance(value, dict) else value
+                         for name, value in self.counters.items()},
+            'gauges': dict(self.gauges),
+            'histograms': {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+        }
+
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(reports, report_ages):
+    """Render the latest report of each laser in the Prometheus text format."""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        metric = f'logscraper_{name}'
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for laser_id, report in sorted(reports.items()):
+            label = f'laser="{label_value(laser_id)}"'
+            if kind == 'histogram':
+                histogram = report.get('histograms', {}).get(name)
+                if histogram is None:
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram['counts']):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{label}}} {histogram["sum"]}')
+                lines.append(f'{metric}_count{{{label}}} {histogram["count"]}')
+            else:
+                value = report.get(kind + 's', {}).get(name)
+                if isinstance(value, dict):
+                    for key, count in sorted(value.items()):
+                        lines.append(f'{metric}{{{label},{METRIC_LABELS[name]}="{label_value(key)}"}} {count}')
+                elif value is not None:
+                    lines.append(f'{metric}{{{label}}} {value}')
+
+    # Worked out by the server, so a monitor that stopped reporting shows up too
+    lines.append('# HELP logscraper_report_age_seconds Seconds since the server last heard from the monitor')
+    lines.append('# TYPE logscraper_report_age_seconds gauge')
+    for laser_id, age in sorted(report_ages.items()):
+        lines.append(f'logscraper_report_age_seconds{{laser="{label_value(laser_id)}"}} {age:.1f}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+STALL_CHECK_INTERVAL = 10  # Seconds between heartbeat checks
+LOOP_STALL_TIMEOUT = 300   # Seconds the log loop may go without turning before it counts as stuck
+SINK_STALL_TIMEOUT = 120   # Seconds a sink may spend on one batch before it counts as stuck
+STOP_TIMEOUT = 10          # Seconds a cancelled log loop gets to write its checkpoint and close the file
+RESTART_MIN_DELAY = 5      # Seconds before the first restart of a failed or stalled log loop
+RESTART_MAX_DELAY = 300    # Longest wait between restarts
+HEALTHY_RUN = 600          # Seconds a log loop has to run before its restart delay starts over
+# Longest a laser's log is expected to stay quiet in each status, in seconds. A cutting laser logs
+# constantly, a laser in setup or idle may not log for hours. Overridden per laser in lasers.json.
+DEFAULT_QUIET_LIMITS = {'Cutting': 900}
+
+
+class Heartbeat:
+    """When a monitor's log loop last turned, last moved its read offset and last sent to the server."""
+
+    def __init__(self):
+        now = time.monotonic()
+        self.last_loop = now
+        self.last_progress = now  # When the read offset last moved (new log text arrived)
+        self.last_emit = None     # When a runtime message last went out
+        self.offset = None
+
+    def beat(self):
+        self.last_loop = time.monotonic()
+
+    def progress(self, offset):
+        self.offset = offset
+        self.last_progress = time.monotonic()
+
+    def emitted(self):
+        self.last_emit = time.monotonic()
+
+    def restart(self):
+        """A fresh log loop gets the full timeouts again."""
+        self.last_loop = self.last_progress = time.monotonic()
+
+
+class MonitorWatchdog:
+    """Run a monitor's log loop as a task and restart it, with backoff, when it fails or stalls.
+
+    The loop is stalled when it stops turning, or when the log stays quiet for longer than the
+    laser is expected to in its current status. While it is down the dashboard shows the laser as
+    Offline rather than its last status. A sink stuck on one batch has just its own task restarted.
+    """
+
+    def __init__(self, monitor, quiet_limits=None):
+        self.monitor = monitor
+        self.quiet_limits = DEFAULT_QUIET_LIMITS if quiet_limits is None else quiet_limits
+        self.restart_delay = RESTART_MIN_DELAY
+
+    def stall_reason(self):
+        """Why the running log loop counts as stuck, or None."""
+        monitor = self.monitor
+        heartbeat = monitor.heartbeat
+        now = time.monotonic()
+        if now - heartbeat.last_loop > LOOP_STALL_TIMEOUT:
+            return 'stalled', f"Log loop has not run for {now - heartbeat.last_loop:.0f} seconds"
+        quiet_limit = self.quiet_limits.get(monitor.current_status)
+        if quiet_limit and now - heartbeat.last_progress > quiet_limit:
+            return 'quiet', (f"No new log lines for {now - heartbeat.last_progress:.0f} seconds "
+                             f"while {monitor.current_status}")
+        return None
+
+    def restart_stuck_sinks(self):
+        now = time.monotonic()
+        for sink in self.monitor.bus.sinks:
+            if not sink.queue.maxsize:
+                continue  # Cancelling would lose the batch, its file calls time out on their own instead
+            if sink.busy_since is not None and now - sink.busy_since > SINK_STALL_TIMEOUT:
+                print(f"[{self.monitor.laser_id}] Sink {sink.name} stuck for {now - sink.busy_since:.0f} seconds, restarting it.")
+                self.monitor.metrics.count('restarts_total', label='sink')
+                sink.task.cancel()
+                sink.task = None
+                sink.busy_since = None
+        self.monitor.bus.start()
+
+    async def watch(self, task):
+        """Wait until the log loop ends or stalls, returning (kind, reason)."""
+        while True:
+            await asyncio.wait([task], timeout=STALL_CHECK_INTERVAL)
+            if task.done():
+                if task.cancelled():
+                    return 'failed', "Log loop was cancelled"
+                error = task.exception()
+                return 'failed', f"Log loop failed: {error}" if error else "Log loop stopped"
+            self.restart_stuck_sinks()
+            stall = self.stall_reason()
+            if stall:
+                task.cancel()
+                # Give it a moment to checkpoint, but a call hung on the network share must not hold us up
+                await asyncio.wait([task], timeout=STOP_TIMEOUT)
+                return stall
+
+    async def run(self):
+        monitor = self.monitor
+        while True:
+            monitor.heartbeat.restart()
+            started = time.monotonic()
+            task = asyncio.ensure_future(monitor.monitor_log_file())
+            try:
+                kind, reason = await self.watch(task)
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+
+            if time.monotonic() - started >= HEALTHY_RUN:
+                self.restart_delay = RESTART_MIN_DELAY
+            print(f"[{monitor.laser_id}] {reason}, restarting it in {self.restart_delay} seconds.")
+            monitor.metrics.count('restarts_total', label=kind)
+            # Reopening the log does not mean a quiet laser is back, wait for it to log something
+            await monitor.set_offline(reason, until_lines=kind == 'quiet')
+            await asyncio.sleep(self.restart_delay)
+            self.restart_delay = min(self.restart_delay * 2, RESTART_MAX_DELAY)
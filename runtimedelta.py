@@ -0,0 +1,56 @@
+"""Sequence-numbered runtime deltas shared by the monitors, the supervisor and the Flask server.
+
+A monitor sends one full snapshot ('runtime_update') and then only what changed ('runtime_delta').
+Every message carries the next sequence number for that laser, and a delta holds a list of ops:
+
+    {'op': 'reset'}                               The runtime was finalized and a new one started
+    {'op': 'append', 'index': i, 'line': {...}}   A new runtime line was added at index i
+    {'op': 'update', 'index': i, 'line': {...}}   Runtime line i changed (finalized, new alarms)
+
+Anyone holding the runtime applies the ops in order. A missing sequence number or an op that
+doesn't fit the runtime held is a gap, and the holder needs a fresh snapshot.
+"""
+
+RESET = 'reset'
+APPEND = 'append'
+UPDATE = 'update'
+
+# Fields carried alongside the runtime in snapshots and deltas (deltas only carry alarm_counts when they changed)
+RUNTIME_STATS = ('avg_cutting_time', 'avg_idle_time', 'bytes_behind', 'alarm_counts', 'stats')
+
+
+def snapshot_state(snapshot):
+    """Build the stored runtime state for a laser from a full snapshot message."""
+    state = {
+        'seq': snapshot.get('seq', 0),
+        'runtime': list(snapshot.get('runtime', [])),
+    }
+    for key in RUNTIME_STATS:
+        state[key] = snapshot.get(key)
+    return state
+
+
+def apply_runtime_delta(state, delta):
+    """Apply a delta to a stored runtime state in place. Returns False if a gap was detected."""
+    if state is None or delta.get('seq') != state['seq'] + 1:
+        return False
+
+    runtime = state['runtime']
+    for op in delta.get('ops', []):
+        kind = op.get('op')
+        if kind == RESET:
+            runtime.clear()
+        elif kind == APPEND:
+            if op['index'] != len(runtime):
+                return False
+            runtime.append(op['line'])
+        elif kind == UPDATE:
+            if op['index'] >= len(runtime):
+                return False
+            runtime[op['index']] = op['line']
+
+    state['seq'] = delta['seq']
+    for key in RUNTIME_STATS:
+        if key in delta:
+            state[key] = delta[key]
+    return True
@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+from itertools import chain
+
+# Runtime line fields, in the order they are serialized
+LINE_FIELDS = (
+    'laser', 'status', 'start_time', 'end_time', 'total_time', 'part_file', 'tech_data',
+    'session_part_count', 'total_part_count', 'details', 'shift_type',
+)
+
+
+def intern(value):
+    """Share one copy of repeated strings (laser id, status, shift type, part file) across every line."""
+    return sys.intern(value) if type(value) is str else value
+
+
+def to_json(value):
+    return json.dumps(value, separators=(',', ':'), default=str)
+
+
+class RuntimeLine:
+    """One status period of a runtime, stored in slots instead of an 11-key dict."""
+
+    __slots__ = LINE_FIELDS + ('_json',)
+
+    def __init__(self, laser, status, start_time, end_time='Ongoing', total_time='N/A', part_file=None,
+                 tech_data=None, session_part_count=0, total_part_count=0, details=None, shift_type=None):
+        self.laser = intern(laser)
+        self.status = intern(status)
+        self.start_time = start_time
+        self.end_time = intern(end_time)
+        self.total_time = intern(total_time)
+        self.part_file = intern(part_file)
+        self.tech_data = intern(tech_data)
+        self.session_part_count = session_part_count
+        self.total_part_count = total_part_count
+        self.details = details  # Details will be added as they occur
+        self.shift_type = intern(shift_type)
+        self._json = None  # Compact JSON, built on first use and dropped when the line changes
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data.get(field) for field in LINE_FIELDS if field in data})
+
+    def finalize(self, end_time, total_time, session_part_count, total_part_count, details):
+        """Close the line with its end time, duration, part counts and alarms."""
+        self.end_time = end_time
+        self.total_time = total_time
+        self.session_part_count = session_part_count
+        self.total_part_count = total_part_count
+        self.details = details
+        self._json = None
+
+    def set_details(self, details):
+        """Point the line at its alarm details, which may have changed in place."""
+        self.details = details
+        self._json = None
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in LINE_FIELDS}
+
+    def to_json(self):
+        if self._json is None:
+            self._json = to_json(self.to_dict())
+        return self._json
+
+
+class Runtime:
+    """The runtime lines of one runtime, serialized lazily from each line's cached JSON.
+
+    With a journal path, the lines can be appended to a JSON lines journal once the next line starts
+    (only the last line of a runtime can still change). The monitor does that off the event loop.
+    Finishing the runtime appends the summary and renames the journal into place, so exporting never
+    rewrites the lines already written. Lines in the journal can be dropped from memory; indexes keep
+    counting from the start of the runtime.
+    """
+
+    __slots__ = ('lines', 'journal_path', 'spilled', 'journaled', 'journal_size')
+
+    def __init__(self, lines=None, journal_path=None, spilled=0, journaled=0, journal_size=0):
+        self.lines = lines or []            # Lines still held in memory, the newest ones
+        self.journal_path = journal_path
+        self.spilled = spilled              # Lines dropped from memory, they come before self.lines
+        self.journaled = journaled          # Lines written to the journal so far
+        self.journal_size = journal_size    # Bytes of the journal that belong to this runtime
+
+    @classmethod
+    def from_list(cls, data, **journal):
+        return cls([RuntimeLine.from_dict(line) for line in data], **journal)
+
+    def append(self, line):
+        self.lines.append(line)
+
+    def __len__(self):
+        return self.spilled + len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines) or self.spilled > 0
+
+    def __getitem__(self, index):
+        if index < 0:
+            return self.lines[index]
+        if index >= self.spilled:
+            return self.lines[index - self.spilled]
+        # Slow path, only hit when a change to a spilled line has to be resent
+        for position, line_json in enumerate(self.journal_lines(self.spilled)):
+            if position == index:
+                return RuntimeLine.from_dict(json.loads(line_json))
+        raise IndexError(index)
+
+    def __iter__(self):
+        for line_json in self.journal_lines(self.spilled):
+            yield RuntimeLine.from_dict(json.loads(line_json))
+        yield from self.lines
+
+    def journal_data(self, include_last=False, extra=b''):
+        """The bytes to journal next: the lines not journaled yet (all but the last one unless include_last)
+        and any extra bytes. Returns them with the number of lines they hold."""
+        end = len(self) if include_last else len(self) - 1
+        lines = self.lines[self.journaled - self.spilled:end - self.spilled]
+        return ''.join([line.to_json() + '\n' for line in lines]).encode('utf-8') + extra, len(lines)
+
+    def write_journal(self, data, sync=False):
+        """Write journal_data's bytes after the ones that belong to the runtime. Blocking file I/O, the
+        lines only count as journaled once journal_written is called."""
+        # Anything in the file past journal_size was written after the last checkpoint of a crashed run
+        with open(self.journal_path, 'r+b' if self.journal_size else 'wb') as file:
+            file.seek(self.journal_size)
+            file.write(data)
+            file.truncate()
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+
+    def journal_written(self, size, count):
+        """Count size bytes holding count lines as journaled, so those lines can leave memory."""
+        self.journal_size += size
+        self.journaled += count
+
+    def spill(self, max_lines, keep):
+        """Once more than max_lines are in memory, drop all but the newest keep of the journaled ones."""
+        if len(self.lines) <= max_lines:
+            return 0
+        count = min(len(self.lines) - keep, self.journaled - self.spilled)
+        if count <= 0:
+            return 0
+        del self.lines[:count]
+        self.spilled += count
+        return count
+
+    def finish(self, summary, path):
+        """Append the rest of the lines and the summary record, then atomically rename the journal to path."""
+        data, count = self.journal_data(include_last=True, extra=(to_json({'summary': summary}) + '\n').encode('utf-8'))
+        self.write_journal(data, sync=True)
+        os.replace(self.journal_path, path)
+        # Only now, a retry after an error writes the lines and summary again from the same place
+        self.journal_written(len(data), count)
+        self.journal_path = None  # The file belongs to the uploader now
+
+    def journal_lines(self, count=None):
+        """Yield the JSON of the first count journaled lines (all of them by default), oldest first."""
+        count = self.journaled if count is None else count
+        if not count:
+            return
+        with open(self.journal_path, 'rb') as file:
+            carry = b''
+            while count > 0:
+                block = file.read(1024 * 1024)
+                if not block:
+                    break
+                lines = (carry + block).split(b'\n')
+                carry = lines.pop()
+                for line in lines[:count]:
+                    yield line.decode('utf-8')
+                count -= len(lines)
+
+    def discard_journal(self):
+        """Remove the journal of a runtime that was exported some other way."""
+        if self.journal_path is not None and self.journal_size and os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def to_list(self):
+        return [json.loads(line_json) for line_json in self.journal_lines(self.spilled)] + \
+            [line.to_dict() for line in self.lines]
+
+    def to_json(self):
+        """Compact JSON array of the lines; only lines that changed since the last call are reserialized."""
+        return '[' + ','.join(chain(self.journal_lines(self.spilled), [line.to_json() for line in self.lines])) + ']'
+
+    def write_json(self, file):
+        """Write the same JSON array as to_json to a binary file without building it in memory."""
+        file.write(b'[')
+        separator = b''
+        for line_json in chain(self.journal_lines(self.spilled), (line.to_json() for line in self.lines)):
+            file.write(separator + line_json.encode('utf-8'))
+            separator = b','
+        file.write(b']')
+
+
+def encode_runtime_data(runtime_data):
+    """Serialize a finalized runtime record to compact JSON bytes, splicing in the runtime's cached JSON."""
+    header = {key: value for key, value in runtime_data.items() if key != 'runtime'}
+    runtime = runtime_data.get('runtime')
+    runtime_json = runtime.to_json() if isinstance(runtime, Runtime) else to_json(runtime)
+    separator = ',' if header else ''
+    return (to_json(header)[:-1] + separator + '"runtime":' + runtime_json + '}').encode('utf-8')
+
+
+def write_runtime_data(file, runtime_data):
+    """Write the same bytes as encode_runtime_data to a binary file, streaming spilled lines from the journal."""
+    runtime = runtime_data.get('runtime')
+    if not isinstance(runtime, Runtime):
+        file.write(encode_runtime_data(runtime_data))
+        return
+    header = {key: value for key, value in runtime_data.items() if key != 'runtime'}
+    separator = ',' if header else ''
+    file.write((to_json(header)[:-1] + separator + '"runtime":').encode('utf-8'))
+    runtime.write_json(file)
+    file.write(b'}')
@@ -0,0 +1,202 @@
+import math
+from datetime import datetime, timezone
+
+SKETCH_ACCURACY = 0.01  # Relative error of the duration percentiles
+GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+QUANTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+
+BUCKET_SECONDS = 300  # Granularity of the rolling utilization and parts per hour
+UTILIZATION_WINDOWS = (('1h', 3600), ('8h', 8 * 3600), ('24h', 24 * 3600))
+ACTIVITY_SPAN = 24 * 3600  # Longest window, older buckets are dropped
+
+
+def epoch_seconds(timestamp):
+    """Seconds since the epoch for one of our UTC ISO timestamps."""
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+
+
+class QuantileSketch:
+    """Log-bucketed histogram of durations (DDSketch style).
+
+    Each value lands in the bucket ceil(log(value) / log(gamma)), so adding is O(1), any quantile comes
+    back within 1% of the true value, and two sketches merge by adding their bucket counts. Durations from
+    a second up to a week need at most a few hundred buckets.
+    """
+
+    __slots__ = ('buckets', 'zeros', 'count')
+
+    def __init__(self, buckets=None, zeros=0):
+        self.buckets = {int(key): count for key, count in (buckets or {}).items()}  # JSON keys come back as strings
+        self.zeros = zeros  # Values of zero seconds, which have no log
+        self.count = zeros + sum(self.buckets.values())
+
+    def add(self, value):
+        if value <= 0:
+            self.zeros += 1
+        else:
+            key = math.ceil(math.log(value) / LOG_GAMMA)
+            self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+
+    def merge(self, other):
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantile(self, q):
+        """The value at quantile q (0 to 1), or None if nothing has been added."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * GAMMA ** key / (GAMMA + 1)  # Middle of the bucket
+        return 2 * GAMMA ** max(self.buckets) / (GAMMA + 1)
+
+    def summary(self):
+        result = {'count': self.count}
+        for name, q in QUANTILES:
+            value = self.quantile(q)
+            result[name] = round(value, 1) if value is not None else None
+        return result
+
+    def to_dict(self):
+        return {'buckets': self.buckets, 'zeros': self.zeros}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('buckets'), data.get('zeros', 0))
+
+
+class ActivityWindow:
+    """Cutting seconds and parts counted in 5-minute buckets over the last 24 hours."""
+
+    __slots__ = ('buckets', 'newest')
+
+    def __init__(self, buckets=None):
+        self.buckets = {int(key): value for key, value in (buckets or {}).items()}  # Bucket -> [cutting, parts]
+        self.newest = max(self.buckets, default=0)
+
+    def bucket(self, epoch):
+        key = int(epoch // BUCKET_SECONDS)
+        entry = self.buckets.get(key)
+        if entry is None:
+            entry = self.buckets[key] = [0.0, 0]
+            if key > self.newest:
+                self.newest = key
+                if len(self.buckets) > ACTIVITY_SPAN // BUCKET_SECONDS + 1:
+                    self.prune()
+        return entry
+
+    def prune(self):
+        oldest = self.newest - ACTIVITY_SPAN // BUCKET_SECONDS
+        for key in [key for key in self.buckets if key < oldest]:
+            del self.buckets[key]
+
+    def add_cutting(self, start, end):
+        """Spread a cutting period (epoch seconds) over the buckets it covers."""
+        start = max(start, end - ACTIVITY_SPAN)
+        while start < end:
+            bucket_end = (start // BUCKET_SECONDS + 1) * BUCKET_SECONDS
+            self.bucket(start)[0] += min(end, bucket_end) - start
+            start = bucket_end
+
+    def add_parts(self, epoch, count=1):
+        self.bucket(epoch)[1] += count
+
+    def totals(self, now, seconds):
+        """Cutting seconds and parts in the buckets of the last `seconds` before now."""
+        first = int((now - seconds) // BUCKET_SECONDS) + 1
+        last = int(now // BUCKET_SECONDS)
+        cutting = parts = 0
+        for key, (bucket_cutting, bucket_parts) in self.buckets.items():
+            if first <= key <= last:
+                cutting += bucket_cutting
+                parts += bucket_parts
+        return cutting, parts
+
+    def to_dict(self):
+        return {'buckets': self.buckets}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('buckets'))
+
+
+class LaserStats:
+    """Cycle and idle duration percentiles, per laser and per shift, plus rolling utilization and parts per hour.
+
+    Lives for as long as the monitor does, so a new runtime does not reset it.
+    """
+
+    def __init__(self, cycle=None, idle=None, shifts=None, activity=None):
+        self.cycle = cycle or QuantileSketch()
+        self.idle = idle or QuantileSketch()
+        self.shifts = shifts or {}  # Shift name -> {'cycle': sketch, 'idle': sketch}
+        self.activity = activity or ActivityWindow()
+        self.changed = True  # Whether anything was recorded since the summary was last sent
+
+    def record_line(self, status, shift_type, start_time, end_time, seconds):
+        """Add a finalized Cutting or Idle runtime line."""
+        kind = 'cycle' if status == 'Cutting' else 'idle'
+        self.changed = True
+        getattr(self, kind).add(seconds)
+        if shift_type:
+            shift = self.shifts.get(shift_type)
+            if shift is None:
+                shift = self.shifts[shift_type] = {'cycle': QuantileSketch(), 'idle': QuantileSketch()}
+            shift[kind].add(seconds)
+        if kind == 'cycle':
+            end = epoch_seconds(end_time)
+            self.activity.add_cutting(end - seconds, end)
+
+    def record_part(self, timestamp):
+        self.activity.add_parts(epoch_seconds(timestamp))
+        self.changed = True
+
+    def summary(self, now=None, cutting_since=None):
+        """The stats sent with the runtime; cutting_since counts an ongoing cutting line towards utilization."""
+        now = epoch_seconds(now) if now else datetime.now(timezone.utc).timestamp()
+        ongoing = now - epoch_seconds(cutting_since) if cutting_since else 0
+
+        utilization = {}
+        for name, seconds in UTILIZATION_WINDOWS:
+            cutting, _ = self.activity.totals(now, seconds)
+            utilization[name] = round(min((cutting + min(max(ongoing, 0), seconds)) / seconds, 1.0), 3)
+        _, parts_last_hour = self.activity.totals(now, 3600)
+
+        return {
+            'cycle': self.cycle.summary(),
+            'idle': self.idle.summary(),
+            'shifts': {name: {kind: sketch.summary() for kind, sketch in shift.items()}
+                       for name, shift in self.shifts.items()},
+            'utilization': utilization,
+            'parts_per_hour': parts_last_hour,
+        }
+
+    def to_dict(self):
+        return {
+            'cycle': self.cycle.to_dict(),
+            'idle': self.idle.to_dict(),
+            'shifts': {name: {kind: sketch.to_dict() for kind, sketch in shift.items()}
+                       for name, shift in self.shifts.items()},
+            'activity': self.activity.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        return cls(
+            cycle=QuantileSketch.from_dict(data['cycle']),
+            idle=QuantileSketch.from_dict(data['idle']),
+            shifts={name: {kind: QuantileSketch.from_dict(sketch) for kind, sketch in shift.items()}
+                    for name, shift in data.get('shifts', {}).items()},
+            activity=ActivityWindow.from_dict(data.get('activity', {})),
+        )
@@ -0,0 +1,80 @@
+import re
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+
+# Shift windows in local time, each shift runs until the next one starts
+DEFAULT_SHIFTS = [
+    {'name': 'Day Shift', 'start': '06:00'},
+    {'name': 'Shift Change', 'start': '16:30'},
+    {'name': 'Night Shift', 'start': '20:00'},
+]
+
+
+def parse_time(timestamp):
+    """Parse one of our UTC ISO timestamps into an aware datetime."""
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+
+def parse_start(start):
+    """Seconds after local midnight of a shift start written as "HH:MM", raising ValueError for anything else."""
+    match = re.fullmatch(r'(\d{1,2}):(\d{2})', start) if isinstance(start, str) else None
+    if match is None or int(match[1]) > 23 or int(match[2]) > 59:
+        raise ValueError(f"Shift start {start!r} is not a time like 06:00")
+    return int(match[1]) * 3600 + int(match[2]) * 60
+
+
+class ShiftSchedule:
+    """Classify timestamps into shifts and find the next shift boundary.
+
+    Timestamps are the UTC ISO strings used on runtime lines ("2024-05-01T10:00:00+00:00"). Those
+    compare correctly as strings, so the window around the last timestamp looked up is cached and
+    a lookup inside it costs two string comparisons.
+    """
+
+    def __init__(self, shifts=None):
+        # By time of day, not by the start string ("6:00" sorts after "16:30")
+        shifts = sorted((parse_start(shift['start']), shift['name']) for shift in shifts or DEFAULT_SHIFTS)
+        for (start, name), (next_start, next_name) in zip(shifts, shifts[1:]):
+            if start == next_start:
+                raise ValueError(f"{name} and {next_name} both start at {start // 3600:02d}:{start % 3600 // 60:02d}")
+        self.names = [name for start, name in shifts]
+        self.starts = [start for start, name in shifts]  # Seconds after local midnight each shift starts
+        self.window = (None, None, None)  # (start, end, name) of the last window looked up
+
+    def window_at(self, timestamp):
+        """Return (start, end, name) of the shift window containing a timestamp."""
+        start, end, name = self.window
+        if start is not None and start <= timestamp < end:
+            return self.window
+
+        local_dt = parse_time(timestamp).astimezone()  # Convert to local time
+        midnight = datetime(local_dt.year, local_dt.month, local_dt.day)
+        seconds = (local_dt.replace(tzinfo=None) - midnight).total_seconds()
+
+        index = bisect_right(self.starts, seconds) - 1
+        if index < 0:
+            # Before the first shift of the day, still in the last shift of the day before
+            index = len(self.starts) - 1
+            start_local = midnight - timedelta(days=1) + timedelta(seconds=self.starts[index])
+            end_local = midnight + timedelta(seconds=self.starts[0])
+        else:
+            start_local = midnight + timedelta(seconds=self.starts[index])
+            if index + 1 < len(self.starts):
+                end_local = midnight + timedelta(seconds=self.starts[index + 1])
+            else:
+                end_local = midnight + timedelta(days=1, seconds=self.starts[0])
+
+        self.window = (self.to_utc(start_local), self.to_utc(end_local), self.names[index])
+        return self.window
+
+    def shift_at(self, timestamp):
+        """Name of the shift a timestamp falls in."""
+        return self.window_at(timestamp)[2]
+
+    def next_boundary(self, timestamp):
+        """The timestamp at which the shift containing this timestamp ends."""
+        return self.window_at(timestamp)[1]
+
+    def to_utc(self, local_dt):
+        """Convert a naive local time to our UTC ISO form (DST is handled by the local zone)."""
+        return local_dt.astimezone(timezone.utc).isoformat(timespec='seconds')
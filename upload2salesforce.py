@@ -9,40 +9,60 @@ from dotenv import load_dotenv
 # Load environment variables from a .env file if you're using one
 load_dotenv()
 
+def is_finalized_runtime(path):
+    """Monitors rename each finished runtime to finalized_runtime_<laser>_<started>.jsonl."""
+    name = os.path.basename(path)
+    return name.startswith('finalized_runtime_') and name.endswith('.jsonl')
+
+
+def read_runtime_file(file_path):
+    """Rebuild the runtime record from a finalized runtime file: one runtime line per line, then the summary."""
+    data = {'runtime': []}
+    with open(file_path, 'r') as file:
+        for line in file:
+            record = json.loads(line)
+            if 'summary' in record:
+                data.update(record['summary'])
+            else:
+                data['runtime'].append(record)
+    return data
+
+
 class JSONFileHandler(FileSystemEventHandler):
     def __init__(self, salesforce_instance):
         self.sf = salesforce_instance
         self.timers = {}
 
-    # Capture both created and modified events for more reliability
-    def on_modified(self, event):
-        if event.src_path.endswith('.json'):
-            self.handle_event(event)
-
+    # Finalized runtimes are renamed into place complete, and never rewritten
     def on_created(self, event):
-        if event.src_path.endswith('.json'):
-            self.handle_event(event)
+        if is_finalized_runtime(event.src_path):
+            self.handle_event(event.src_path)
+
+    def on_moved(self, event):
+        if is_finalized_runtime(event.dest_path):
+            self.handle_event(event.dest_path)
 
-    # Centralized event handling for modifications/creations
-    def handle_event(self, event):
-        print(f"Detected change in file: {event.src_path}")
+    # Centralized event handling for new files
+    def handle_event(self, file_path):
+        print(f"Detected new file: {file_path}")
         # Cancel any existing timer for this file
-        if event.src_path in self.timers:
-            self.timers[event.src_path].cancel()
-            print(f"Canceled existing timer for: {event.src_path}")
+        if file_path in self.timers:
+            self.timers[file_path].cancel()
+            print(f"Canceled existing timer for: {file_path}")
 
         # Start a new timer with debounce logic to avoid multiple triggers
-        timer = threading.Timer(1.0, self.process_file, [event.src_path])
-        self.timers[event.src_path] = timer
+        timer = threading.Timer(1.0, self.process_file, [file_path])
+        self.timers[file_path] = timer
         timer.start()
 
     def process_file(self, file_path):
         print(f"Processing file: {file_path}")
         try:
-            with open(file_path, 'r') as file:
-                data = json.load(file)
-                print(f"Loaded data from file: {file_path}")
-                self.upload_to_salesforce(data)
+            data = read_runtime_file(file_path)
+            print(f"Loaded data from file: {file_path}")
+            if self.upload_to_salesforce(data):
+                # Mark it done so a restart does not upload it again
+                os.replace(file_path, file_path + '.uploaded')
         except Exception as e:
             print(f"Error reading or processing file {file_path}: {e}")
         finally:
@@ -51,6 +71,13 @@ class JSONFileHandler(FileSystemEventHandler):
                 del self.timers[file_path]
                 print(f"Timer removed for: {file_path}")
 
+    def process_backlog(self, directory):
+        """Upload runtimes finalized while the uploader was not running, oldest first."""
+        for name in sorted(os.listdir(directory)):
+            file_path = os.path.join(directory, name)
+            if is_finalized_runtime(file_path):
+                self.process_file(file_path)
+
     def upload_to_salesforce(self, data):
         try:
             print("Preparing to upload data to Salesforce...")
@@ -90,8 +117,10 @@ class JSONFileHandler(FileSystemEventHandler):
                 print(f"Uploading child record: {child_record}")
                 self.sf.Runtime_Line__c.create(child_record)
                 print("Child record uploaded successfully")
+            return True
         except Exception as e:
             print(f"Error uploading to Salesforce: {e}")
+            return False
 
 def main():
     print("Starting Salesforce uploader...")
@@ -107,6 +136,7 @@ def main():
     event_handler = JSONFileHandler(sf)
     observer = Observer()
     directory_to_watch = 'C:\\logscraper\\Flask_server\\Machine scripts'
+    event_handler.process_backlog(directory_to_watch)
     observer.schedule(event_handler, path=directory_to_watch, recursive=False)
     observer.start()
 